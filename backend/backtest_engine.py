@@ -1,17 +1,182 @@
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
 
-def calculate_indicators(df):
+from candle_cache import DATE_FORMAT, IST, MINUTE, now_ist, to_naive_ist
+from candle_warehouse import CandleWarehouse
+from indicators import ACTIVE_INDICATORS, compute, ema, required_bars, stack_frames
+from trading_calendar import CALENDAR, session_open
+
+# Bump whenever a rule, threshold or indicator changes: memoized backtest results
+# from an older version are then recomputed instead of reused
+RULESET_VERSION = 1
+SPREAD_MAX_PCT = 1.5
+EXTENSION_MAX_PCT = 6
+# Trading sessions the fallback (last available) trigger candle may lag the signal by
+OUTDATED_SESSIONS = 3
+MIN_BARS = 20
+# validate_batch lookup keys: minutes since the epoch fit well within 2**26 until 2097
+KEY_SPAN = 1 << 26
+MINUTES_PER_DAY = 24 * 60
+
+EMA_SPANS = {'EMA_9': 9, 'EMA_20': 20}
+# (symbol, interval) states kept by IncrementalIndicators; the least recently used go first
+MAX_INDICATOR_STATES = 5000
+
+RESULT_FIELDS = ['stop_loss', 'target', 'ltp', 'close', 'ema_9', 'ema_20', 'spread_pct',
+                 'price_extension_pct', 'is_mtf', 'is_fno', 'is_stage2', 'note']
+
+# Shared reader over the Parquet history written by SmartApiClient
+_warehouse = CandleWarehouse()
+
+def load_candles(symbol, interval, from_date, to_date, warehouse=None):
+    """
+    Loads OHLCV bars for symbol from the local candle warehouse.
+    Dates are "YYYY-MM-DD HH:MM". Returns None unless the warehouse holds every
+    trading bar of the window (or if pyarrow is not installed), in which case the
+    caller should fetch from the API.
+    """
+    start = datetime.strptime(from_date, DATE_FORMAT)
+    end = datetime.strptime(to_date, DATE_FORMAT) + MINUTE
+    # The warehouse only holds closed sessions
+    if end > now_ist().replace(hour=0, minute=0, second=0, microsecond=0):
+        return None
+    df = (warehouse or _warehouse).read(symbol, interval, from_date, to_date)
+    if df is None or len(df) < CALENDAR.bars_between(start, end, interval):
+        return None
+    return df
+
+def calculate_indicators(df, names=ACTIVE_INDICATORS):
     """
-    Adds EMA 9 and EMA 20 to the dataframe.
+    Adds the named indicators (default: EMA 9 and EMA 20) to the dataframe,
+    using the NumPy kernels from the indicator registry.
     """
     if df is None or len(df) < 20:
         return df
 
-    # Calculate EMAs using native pandas
-    df['EMA_9'] = df['close'].ewm(span=9, adjust=False).mean()
-    df['EMA_20'] = df['close'].ewm(span=20, adjust=False).mean()
+    _, stacked = stack_frames({'': df})
+    for column, values in compute(stacked, names).items():
+        df[column] = values[0]
     return df
 
+def history_start(signal_time, interval, names=ACTIVE_INDICATORS):
+    """
+    Earliest bar to request so the named indicators are warmed up by the first bar of
+    the signal day: just enough whole trading sessions before it, skipping weekends
+    and NSE holidays. Sized from the indicators' declared lookback.
+    """
+    bars = max(required_bars(names), MIN_BARS)
+    sessions = math.ceil(bars / CALENDAR.bars_per_session(interval))
+    return session_open(CALENDAR.sessions_back(signal_time.date(), sessions))
+
+class IndicatorState:
+    """
+    Last EMA state of one (symbol, interval): first and last bar time (ns) of the frame
+    it was computed on, bars in between, and EMA values at the last bar and the one before.
+    """
+    __slots__ = ('first_time', 'last_time', 'bars', 'emas', 'before')
+
+    def __init__(self, first_time, last_time, bars, emas, before):
+        self.first_time = first_time
+        self.last_time = last_time
+        self.bars = bars
+        self.emas = emas
+        self.before = before
+
+class IncrementalIndicators:
+    """
+    Keeps the last EMA state per (symbol, interval) so indicators are not replayed from scratch.
+
+    A frame continues from the state only when the result is identical to
+    calculate_indicators on that frame: it starts at the state's first bar, holds the
+    same bars up to the state's last bar, and no bar before that one is needed (see
+    apply). Only the bars from the state's last bar on are then computed; that bar
+    itself is recomputed from the EMA before it, since a live bar may have moved.
+    Any other frame is computed from its first bar.
+    """
+
+    def __init__(self, max_states=MAX_INDICATOR_STATES):
+        self.max_states = max_states
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def emas(self, symbol, interval, times, closes, needed_from=None):
+        """
+        {'EMA_9': values, 'EMA_20': values} over sorted naive IST bar times (a
+        DatetimeIndex) and their closes, or None below MIN_BARS bars. needed_from is
+        the earliest signal time the caller will look up (see find_trigger); bars before
+        it may be left NaN. Without it every bar is computed.
+        """
+        if len(closes) < MIN_BARS:
+            return None
+        ns = times.as_unit('ns').asi8
+        key = (symbol, interval)
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+
+        start = 0
+        if state is not None and needed_from is not None and ns[0] == state.first_time:
+            position = int(np.searchsorted(ns, state.last_time))
+            needed, _ = find_trigger(times, needed_from)
+            if position + 1 == state.bars and position < len(ns) and ns[position] == state.last_time \
+                    and position <= max(needed, 0):
+                start = position
+
+        columns, last, before = {}, {}, {}
+        for name, span in EMA_SPANS.items():
+            seed = state.before[name] if start else np.nan
+            tail = ema(closes[None, start:], span, [seed])[0]
+            column = np.full(len(closes), np.nan)
+            column[start:] = tail
+            columns[name] = column
+            last[name] = tail[-1]
+            before[name] = tail[-2] if len(tail) > 1 else seed
+
+        with self._lock:
+            self._states[key] = IndicatorState(ns[0], ns[-1], len(ns), last, before)
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_states:
+                self._states.popitem(last=False)
+        return columns
+
+    def apply(self, symbol, interval, df, needed_from=None):
+        """Adds EMA 9 and EMA 20 to one symbol's frame (see emas)."""
+        if df is None:
+            return df
+        columns = self.emas(symbol, interval, bar_index(df), df['close'].to_numpy(dtype=float), needed_from)
+        if columns is not None:
+            for name, values in columns.items():
+                df[name] = values
+        return df
+
+def bar_index(df):
+    """
+    Sorted naive IST bar times of a candle frame. Frames from the candle cache and
+    warehouse already carry them as their index; other frames are indexed from 'date'.
+    """
+    if isinstance(df.index, pd.DatetimeIndex) and df.index.is_monotonic_increasing:
+        return df.index
+    return pd.DatetimeIndex(to_naive_ist(df['date']))
+
+def find_trigger(times, signal_time):
+    """
+    Locates the trigger candle in sorted bar times by binary search.
+    Returns (position, exact): exact is True for the first bar of the signal date (if it
+    is at or before the signal), otherwise position is the last bar at or before the
+    signal (as-of), or -1 if there is none.
+    """
+    day = signal_time.normalize()
+    first = times.searchsorted(day, side='left')
+    if first < len(times) and times[first] < day + pd.Timedelta(days=1) and times[first] <= signal_time:
+        return int(first), True
+    return int(times.searchsorted(signal_time, side='right')) - 1, False
+
 def validate_setup(row, historical_df):
     """
     Validates the Long Setup for a single signal.
@@ -30,32 +195,20 @@ def validate_setup(row, historical_df):
     if historical_df is None or len(historical_df) < 20:
         return {'valid': False, 'reason': 'Insufficient Data'}
 
-    # Get the latest candle (Trigger Candle)
-    # Assuming 'date' in signal row matches the last candle in historical_df or we find it.
-    # The signal date is ISO format. historical_df date is datetime.
-    
-    signal_date = pd.to_datetime(row['date']).date()
-    
-    # Locate the row in historical_df that matches the signal date
-    # Note: historical_df might have time component if ONE_MINUTE, but let's assume ONE_DAY for swing
-    # or handle the date matching carefully.
-    
+    # Trigger candle: the first bar of the signal date, found by binary search over the
+    # frame's sorted bar times. If the date has no bars at or before the signal, fall back
+    # to the last bar before it, provided it is no more than a few sessions old.
     try:
-        # Find exact match or closest previous match
-        trigger_candle = historical_df[historical_df['date'].dt.date == signal_date]
-        
-        if trigger_candle.empty:
-            # Maybe the signal was generated AFTER market close, so it refers to 'today' but data might be there?
-            # Or signal date is 'Next Day' for action? Usually signal date = data date.
-            # Let's try matching the last available candle if exact date not found?
-            # No, dangerous. Let's return Invalid if date mismatch.
-            # actually, let's use the last row of the DF provided it is close to signal date.
-            trigger_candle = historical_df.iloc[-1]
-            trigger_date = trigger_candle['date'].date()
-            if abs((trigger_date - signal_date).days) > 5:
+        signal_time = parse_signal_time(row['date'])
+        times = bar_index(historical_df)
+        position, exact = find_trigger(times, signal_time)
+        if position < 0:
+            return {'valid': False, 'reason': 'Insufficient Data'}
+        trigger_candle = historical_df.iloc[position]
+        if not exact:
+            trigger_date = times[position].date()
+            if abs(CALENDAR.sessions_between(trigger_date, signal_time.date())) > OUTDATED_SESSIONS:
                  return {'valid': False, 'reason': 'Data Outdated'}
-        else:
-            trigger_candle = trigger_candle.iloc[0]
 
     except Exception as e:
         return {'valid': False, 'reason': f"Date Error: {e}"}
@@ -81,11 +234,11 @@ def validate_setup(row, historical_df):
     if not (close > ema_9):
          return {'valid': False, 'reason': 'Close below EMA 9'}
 
-    # 4. "Ideal Zone" Spread Rule (Now corrected to <= 1.5% max)
+    # 4. "Ideal Zone" Spread Rule (<= SPREAD_MAX_PCT)
     # Rule: abs(EMA9 - EMA20) / EMA20 
     spread_pct = abs(ema_9 - ema_20) / ema_20 * 100
     
-    if spread_pct > 1.5:
+    if spread_pct > SPREAD_MAX_PCT:
         return {'valid': False, 'reason': f'Overextended ({spread_pct:.2f}%)'}
 
     # 5. Stage 2 and MTF check (from Signal Row)
@@ -96,9 +249,9 @@ def validate_setup(row, historical_df):
     stop_loss = row.get('stop_loss', 0)
     target = row.get('next_target', 0)
 
-    # 6. Price Extension Filter: (Close - EMA20) / EMA20 <= 6%
+    # 6. Price Extension Filter: (Close - EMA20) / EMA20 <= EXTENSION_MAX_PCT
     price_extension_pct = ((close - ema_20) / ema_20) * 100
-    if price_extension_pct > 6:
+    if price_extension_pct > EXTENSION_MAX_PCT:
        return {'valid': False, 'reason': f'Price Extended ({price_extension_pct:.2f}%)'}
 
     # Calculate 'New' badge from appearance array
@@ -126,3 +279,150 @@ def validate_setup(row, historical_df):
         'is_stage2': row.get('is_stage2', False),
         'note': note
     }
+
+def parse_signal_time(value):
+    """One signal timestamp as a naive Timestamp (see parse_signal_times)."""
+    signal_time = pd.Timestamp(value)
+    if signal_time.tz is not None:
+        signal_time = signal_time.tz_localize(None)
+    return signal_time
+
+def parse_signal_times(signals_df):
+    """Signal timestamps as naive datetimes, the same convention as the candle request window."""
+    times = pd.to_datetime(signals_df['date'], format='ISO8601')
+    if times.dt.tz is not None:
+        times = times.dt.tz_localize(None)
+    return times
+
+def validate_batch(signals_df, candles_df, signal_times=None):
+    """
+    Vectorized validate_setup over many signals at once.
+
+    signals_df: brkpoint signal rows (tradingsymbol, date, close, ltp, is_stage2, ...).
+    candles_df: candles for all symbols stacked, with a 'symbol' column and the
+                EMA_9 / EMA_20 columns from calculate_indicators. A dict of equal-length
+                symbol, date, close, EMA_9 and EMA_20 arrays also works.
+    signal_times: parse_signal_times(signals_df), if the caller has already parsed them.
+
+    Each signal only sees bars up to its own timestamp. The trigger candle and every
+    rule (EMA order, price above EMAs, spread, Stage 2, extension) are evaluated as
+    column operations in one pass, with the same reasons, in the same order, as
+    validate_setup.
+
+    Returns a frame aligned with signals_df: valid, reason and the metric columns.
+    """
+    if signals_df.empty or candles_df is None or 'EMA_9' not in candles_df or not len(candles_df['date']):
+        return pd.DataFrame({'valid': False, 'reason': 'Insufficient Data'}, index=signals_df.index)
+    if signal_times is None:
+        signal_times = parse_signal_times(signals_df)
+    n = len(signals_df)
+
+    # Candles sorted by (symbol, time) and keyed as symbol_code * KEY_SPAN + minute, so
+    # both the exact (first bar of the signal date) and the as-of (last bar at or before
+    # the signal) lookups are a single searchsorted over one sorted array.
+    codes, symbols = pd.factorize(candles_df['symbol'])
+    dates = pd.DatetimeIndex(candles_df['date'])
+    if dates.tz is not None:
+        dates = dates.tz_convert(IST).tz_localize(None)
+    minutes = dates.to_numpy(dtype='datetime64[m]').astype(np.int64)
+    order = np.lexsort((minutes, codes))
+    keys = codes[order] * KEY_SPAN + minutes[order]
+
+    signal_codes = pd.Index(symbols).get_indexer(signals_df['tradingsymbol'])
+    signal_minutes = signal_times.to_numpy(dtype='datetime64[m]').astype(np.int64)
+    day_minutes = signal_minutes - signal_minutes % MINUTES_PER_DAY
+    known = signal_codes >= 0
+    base = signal_codes * KEY_SPAN
+
+    # As-of: the fallback trigger, and the number of bars the signal sees
+    asof_pos = np.searchsorted(keys, base + signal_minutes, side='right') - 1
+    has_asof = known & (asof_pos >= 0) & (keys[np.maximum(asof_pos, 0)] >= base)
+    group_start = np.searchsorted(keys, base, side='left')
+    bars_seen = np.where(has_asof, asof_pos - group_start + 1, 0)
+
+    # Exact: first bar of the signal date, if it is at or before the signal
+    exact_pos = np.searchsorted(keys, base + day_minutes, side='left')
+    exact_key = keys[np.minimum(exact_pos, len(keys) - 1)]
+    has_exact = known & (exact_pos < len(keys)) & \
+        (exact_key < base + day_minutes + MINUTES_PER_DAY) & (exact_key <= base + signal_minutes)
+
+    asof_day = (keys[np.maximum(asof_pos, 0)] - base) // MINUTES_PER_DAY
+    sessions_off = np.abs(CALENDAR.positions(asof_day.astype('datetime64[D]')) -
+                          CALENDAR.positions((day_minutes // MINUTES_PER_DAY).astype('datetime64[D]')))
+    outdated = ~has_exact & (sessions_off > OUTDATED_SESSIONS)
+
+    position = np.where(has_exact, exact_pos, np.maximum(asof_pos, 0))
+    found = has_exact | has_asof
+
+    def trigger(col):
+        values = np.asarray(candles_df[col], dtype=float)[order]
+        return np.where(found, values[np.minimum(position, len(values) - 1)], np.nan)
+
+    hist_close = trigger('close')
+    ema_9 = trigger('EMA_9')
+    ema_20 = trigger('EMA_20')
+    if 'close' in signals_df:
+        close = pd.to_numeric(signals_df['close'], errors='coerce').to_numpy(dtype=float)
+    else:
+        close = hist_close
+    spread_pct = abs(ema_9 - ema_20) / ema_20 * 100
+    price_extension_pct = (close - ema_20) / ema_20 * 100
+    if 'is_stage2' in signals_df:
+        is_stage2 = np.array([bool(v) for v in signals_df['is_stage2']])
+    else:
+        is_stage2 = np.zeros(n, dtype=bool)
+
+    insufficient = bars_seen < MIN_BARS
+    ema_order = ~(ema_9 > ema_20)
+    below = ~((close > ema_9) & (close > ema_20))
+    overextended = spread_pct > SPREAD_MAX_PCT
+    not_stage2 = ~is_stage2
+    extended = price_extension_pct > EXTENSION_MAX_PCT
+
+    # np.select picks the first matching rule, mirroring validate_setup's early returns
+    conditions = [insufficient, outdated, ema_order, below, overextended, not_stage2, extended]
+    reasons = [
+        'Insufficient Data',
+        'Data Outdated',
+        'EMA 9 < EMA 20',
+        'Price below EMAs',
+        np.array([f'Overextended ({v:.2f}%)' for v in spread_pct], dtype=object),
+        'Not Stage 2',
+        np.array([f'Price Extended ({v:.2f}%)' for v in price_extension_pct], dtype=object),
+    ]
+
+    def column(name, default):
+        return signals_df[name].to_numpy() if name in signals_df else np.full(n, default, dtype=object)
+
+    appearance = column('appearance', None)
+    note = column('note', '')
+    # Built in one go: inserting the columns one by one dominates the cost for a single symbol
+    return pd.DataFrame({
+        'valid': ~np.logical_or.reduce(conditions),
+        'reason': np.select(conditions, reasons, default='Valid Setup'),
+        'stop_loss': column('stop_loss', 0),
+        'target': column('next_target', 0),
+        'ltp': column('ltp', None),
+        'close': close,
+        'ema_9': ema_9,
+        'ema_20': ema_20,
+        'spread_pct': spread_pct,
+        'price_extension_pct': price_extension_pct,
+        'is_mtf': column('is_mtf', False),
+        'is_fno': column('is_fno', False),
+        'is_stage2': column('is_stage2', False),
+        # 'New' badge: on the list today (appearance[0]) but not yesterday (appearance[1])
+        'note': ['New' if isinstance(a, list) and len(a) > 1 and a[0] and not a[1] else n
+                 for a, n in zip(appearance, note)],
+    }, index=signals_df.index)
+
+def batch_result(result_row):
+    """One validate_batch row as the dict validate_setup would have returned."""
+    if not result_row['valid']:
+        return {'valid': False, 'reason': result_row['reason']}
+    result = {'valid': True, 'reason': result_row['reason']}
+    for field in RESULT_FIELDS:
+        value = result_row[field]
+        # Plain Python scalars, so results stay JSON-serialisable
+        result[field] = value.item() if isinstance(value, np.generic) else value
+    return result
@@ -0,0 +1,408 @@
+import os
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from smart_api_client import SmartApiClient
+from rate_limiter import FetchStats
+from brkpoint_api import fetch_signals, parse_date
+from trading_calendar import CALENDAR
+from backtest_engine import IncrementalIndicators, parse_signal_times, bar_index, history_start, load_candles, validate_batch, batch_result
+from parallel_engine import ParallelEngine
+
+# Global Client Instance
+client = None
+# EMA state per (symbol, interval), shared across runs so repeat windows are not recomputed
+indicators = IncrementalIndicators()
+# Indicator/validation work runs here, off the event loop, so candle fetches for the
+# next symbols keep progressing while one symbol is analysed. One worker keeps the
+# shared indicator state single-threaded.
+engine_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="engine")
+# Optional process-pool mode (ENGINE_WORKERS > 0): analysis runs in worker processes,
+# with candles passed through shared memory, so it never competes with the server for the GIL
+ENGINE_WORKERS = int(os.environ.get("ENGINE_WORKERS", "0"))
+parallel_engine = ParallelEngine(ENGINE_WORKERS) if ENGINE_WORKERS > 0 else None
+# Fetched symbols handed to parallel_engine per call; the batch is split across the workers
+ENGINE_BATCH = int(os.environ.get("ENGINE_BATCH", "200"))
+# ...or fewer, once no fetch has completed for this many seconds, so results keep streaming
+ENGINE_IDLE_S = float(os.environ.get("ENGINE_IDLE_S", "0.5"))
+# get_client runs on executor threads, so concurrent runs must not both log in
+_client_lock = threading.Lock()
+
+SIGNAL_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+# Candle interval the setup rules are evaluated on
+INTERVAL = 'FIFTEEN_MINUTE'
+# SmartAPI serves at most ~200 days of 15-minute bars per request
+MAX_RANGE_DAYS = 180
+# Days whose signals are fetched at once in range mode
+SIGNAL_FETCH_CONCURRENCY = 4
+# Fetch errors that are answers rather than failures: retrying gives the same result
+FINAL_FETCH_ERRORS = ("No candles in range", "Token Not Found")
+
+def get_client():
+    global client
+    with _client_lock:
+        if client is None:
+            new_client = SmartApiClient()
+            if not new_client.login():
+                raise Exception("Failed to login to SmartAPI")
+            client = new_client
+    return client
+
+def backtest_dates(payload):
+    """
+    Resolves the trading days a backtest covers.
+    Either {"date": ...} or {"start_date": ..., "end_date": ..., "weekdays": [0-6]}
+    (weekdays default to Mon-Fri; NSE holidays are skipped).
+    Raises ValueError on a malformed date, bad weekdays or a range with no days in it.
+    """
+    if not payload.get("start_date"):
+        return [parse_date(payload.get("date")).strftime("%Y-%m-%d")]
+
+    start = parse_date(payload["start_date"])
+    end = parse_date(payload.get("end_date") or payload["start_date"])
+    if end < start:
+        raise ValueError("end_date is before start_date")
+    if (end - start).days > MAX_RANGE_DAYS:
+        raise ValueError(f"Range longer than {MAX_RANGE_DAYS} days")
+    weekdays = payload.get("weekdays")
+    if weekdays is None:
+        weekdays = [0, 1, 2, 3, 4]
+    if not isinstance(weekdays, list) or \
+            not all(isinstance(w, int) and not isinstance(w, bool) and 0 <= w <= 6 for w in weekdays):
+        raise ValueError("weekdays must be a list of integers 0 (Monday) to 6 (Sunday)")
+    days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    dates = [d.strftime("%Y-%m-%d") for d in days
+             if d.weekday() in weekdays and (d.weekday() >= 5 or CALENDAR.is_session(d))]
+    if not dates:
+        raise ValueError("No trading days in range")
+    return dates
+
+async def with_idle(items, idle):
+    """
+    Yields the items of an async iterator, plus None each time `idle` seconds pass
+    without a new one (never, for idle=None). The pending item is not cancelled by
+    the timeout, only when the caller stops early.
+    """
+    items = items.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(items.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=idle)
+            if not done:
+                yield None
+                continue
+            try:
+                item = pending.result()
+            except StopAsyncIteration:
+                return
+            pending = None
+            yield item
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+def analyse_symbol(symbol, hist_df, signals):
+    """
+    Indicators and batch validation for one symbol's signals; runs on engine_executor.
+    Each signal only sees bars up to its own timestamp, so later days never leak in.
+    """
+    signal_times = parse_signal_times(signals)
+    times = bar_index(hist_df)
+    closes = hist_df['close'].to_numpy(dtype=float)
+    emas = indicators.emas(symbol, INTERVAL, times, closes, needed_from=signal_times.min())
+    if emas is None:
+        return validate_batch(signals, None, signal_times)
+    # Only the columns validate_batch reads, as plain arrays
+    candles = dict(emas, symbol=np.full(len(closes), symbol, dtype=object), date=times, close=closes)
+    return validate_batch(signals, candles, signal_times)
+
+def fetch_failed(error_msg):
+    """True if a candle fetch failed for a transient reason (throttling, API or network errors)."""
+    return error_msg is not None and not error_msg.startswith(FINAL_FETCH_ERRORS)
+
+def sort_by_quality(trades):
+    # Priority 1: EMA Spread (Lower is better)
+    # Priority 2: Price Extension (Lower is better)
+    trades.sort(key=lambda x: (x.get('spread_pct', 100), x.get('price_extension_pct', 100)))
+    return trades
+
+async def prepare_client():
+    """Login and scrip master load; runs while the signals are being fetched."""
+    api_client = await asyncio.to_thread(get_client)
+    if api_client.token_map is None:
+        await asyncio.to_thread(api_client.load_scrip_master)
+    return api_client
+
+async def load_windows(api_client, jobs, stats):
+    """
+    Yields (symbol, df, error_message) for fetch_many_async jobs. Windows the candle
+    warehouse holds in full are read from it; the rest go through the client.
+    """
+    remaining = []
+    for job in jobs:
+        key, symbol, from_date, to_date, interval = job
+        df = await asyncio.to_thread(load_candles, symbol, interval, from_date, to_date)
+        if df is None:
+            remaining.append(job)
+            continue
+        stats.record('warehouse')
+        yield key, df, None
+    async for result in api_client.fetch_many_async(remaining, stats=stats):
+        yield result
+
+async def _fetch_day(day, semaphore):
+    async with semaphore:
+        return await asyncio.to_thread(fetch_signals, day)
+
+async def run_events(payload, completed=None):
+    """
+    Runs a backtest and yields its events as dicts (the NDJSON stream of /run-backtest).
+
+    Besides the UI events, a 'symbol_done' event records each symbol's per-signal
+    results, and whether they came from a failed fetch or analysis ('failed').
+    `completed` takes those back ({symbol: results}, see completed_symbols) to
+    resume a run: completed symbols are counted in the totals but not fetched or
+    validated again. The 'complete' event counts the failed symbols.
+    """
+    completed = completed or {}
+    dates = backtest_dates(payload)
+    range_mode = len(dates) > 1 or bool(payload.get("start_date"))
+    label = f"{dates[0]} to {dates[-1]}" if range_mode else dates[0]
+
+    started = time.monotonic()
+    first_result = None
+    # Login and the scrip master load overlap the signal HTTP calls
+    client_task = asyncio.create_task(prepare_client())
+    # Mark a failure as retrieved if the run ends before awaiting it
+    client_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    # 1. Fetch Signals (one request per day, several days at once)
+    yield {"type": "status", "message": f"Fetching signals for {label}..."}
+    semaphore = asyncio.Semaphore(SIGNAL_FETCH_CONCURRENCY)
+    day_frames = await asyncio.gather(*(_fetch_day(day, semaphore) for day in dates))
+    signal_frames = []
+    for day, day_df in zip(dates, day_frames):
+        if day_df is None or day_df.empty:
+            if range_mode:
+                yield {"type": "status", "message": f"No signals for {day}"}
+            continue
+        signal_frames.append(day_df.assign(backtest_date=day))
+
+    if not signal_frames:
+        yield {"type": "error", "message": f"No signals found for {label}"}
+        return
+    signals_df = pd.concat(signal_frames, ignore_index=True)
+
+    yield {"type": "status", "message": f"Found {len(signals_df)} raw signals. Starting analysis..."}
+
+    # brkpoint can list the same symbol more than once for a day: validate it once
+    raw_count = len(signals_df)
+    signals_df = signals_df.drop_duplicates(subset=['tradingsymbol', 'backtest_date']).reset_index(drop=True)
+    if len(signals_df) < raw_count:
+        yield {"type": "status", "message": f"Dropped {raw_count - len(signals_df)} duplicate signals."}
+
+    # 2. Init Client and Token Map (started above)
+    if not client_task.done():
+        yield {"type": "status", "message": "Waiting for SmartAPI login / Scrip Master..."}
+    try:
+        api_client = await client_task
+    except Exception as e:
+        yield {"type": "error", "message": f"SmartAPI Login Failed: {str(e)}"}
+        return
+
+    valid_trades = []
+    rejected_trades = []
+    day_results = {day: {'valid': [], 'rejected': 0} for day in signals_df['backtest_date'].unique()}
+
+    def record(day, row):
+        if row['valid']:
+            valid_trades.append(row)
+            day_results[day]['valid'].append(row)
+        else:
+            rejected_trades.append(row)
+            day_results[day]['rejected'] += 1
+
+    # Group signals by symbol: each symbol is fetched once, over a window that
+    # covers every day it appears on. The client's rate limiter keeps the
+    # combined request rate under SmartAPI limits.
+    windows = {}        # symbol -> [from_date_obj, to_date_obj]
+    rows_by_symbol = {}
+    for i, row in signals_df.iterrows():
+        symbol = row['tradingsymbol']
+        if symbol in completed:
+            continue
+        try:
+            to_date_obj = datetime.strptime(row['date'], SIGNAL_DATE_FORMAT)
+            # Window sized from the active indicators' declared lookback, in trading sessions
+            from_date_obj = history_start(to_date_obj, INTERVAL)
+        except Exception as e:
+             record(row['backtest_date'], {'symbol': symbol, 'reason': f"Error: {str(e)}", 'valid': False})
+             continue
+        rows_by_symbol.setdefault(symbol, []).append(i)
+        window = windows.setdefault(symbol, [from_date_obj, to_date_obj])
+        window[0] = min(window[0], from_date_obj)
+        window[1] = max(window[1], to_date_obj)
+
+    # Results of a previous attempt at this run
+    for symbol, results in completed.items():
+        for day, row in results:
+            if day in day_results:
+                record(day, row)
+
+    jobs = [(symbol, symbol, start.strftime("%Y-%m-%d %H:%M"), end.strftime("%Y-%m-%d %H:%M"), INTERVAL)
+            for symbol, (start, end) in windows.items()]
+    pending_days = {}
+    for symbol, indexes in rows_by_symbol.items():
+        for i in indexes:
+            pending_days.setdefault(signals_df.at[i, 'backtest_date'], set()).add(symbol)
+
+    done = len(completed)
+    total = len(jobs) + done
+    failed_symbols = 0
+    if completed:
+        yield {"type": "status", "message": f"Resuming: {done} symbols already done, {len(jobs)} to go."}
+    def finish(symbol, batch, batch_error, error_msg):
+        """Result events for one symbol, given its validate_batch rows (or the failure)."""
+        nonlocal failed_symbols
+        results = []
+        for i in rows_by_symbol[symbol]:
+            day = signals_df.at[i, 'backtest_date']
+            if batch_error is not None:
+                row = {'symbol': symbol, 'reason': f"Error: {str(batch_error)}", 'valid': False}
+            elif batch is not None:
+                row = batch_result(batch.loc[i])
+                row['symbol'] = symbol
+                if row['valid']:
+                    row['date'] = day
+                    # Emit found match immediately!
+                    yield {"type": "match_found", "data": row}
+                else:
+                    # Emit rejected match
+                    yield {"type": "match_rejected", "message": row['reason'], "current_symbol": symbol, "date": day}
+            else:
+                msg = f"No Data ({error_msg})"
+                row = {'symbol': symbol, 'reason': msg, 'valid': False}
+                yield {"type": "match_rejected", "message": msg, "current_symbol": symbol, "date": day}
+            record(day, row)
+            results.append([day, row])
+        failed = batch_error is not None or (batch is None and fetch_failed(error_msg))
+        failed_symbols += failed
+        yield {"type": "symbol_done", "symbol": symbol, "results": results, "failed": failed}
+
+        # A day is complete once every symbol it needs has been processed
+        for day in {signals_df.at[i, 'backtest_date'] for i in rows_by_symbol[symbol]}:
+            pending_days[day].discard(symbol)
+            if range_mode and not pending_days[day]:
+                yield {
+                    "type": "day_complete",
+                    "date": day,
+                    "valid_count": len(day_results[day]['valid']),
+                    "rejected_count": day_results[day]['rejected'],
+                    "valid_trades": sort_by_quality(day_results[day]['valid'])
+                }
+
+    async def evaluate_fetched(fetched):
+        """validate_batch rows for many fetched symbols in one parallel_engine call, or the error."""
+        frames = {symbol: hist_df for symbol, hist_df, _ in fetched if hist_df is not None}
+        if not frames:
+            return None, None
+        indexes = [i for symbol in frames for i in rows_by_symbol[symbol]]
+        try:
+            return await asyncio.to_thread(parallel_engine.evaluate, frames, signals_df.loc[indexes]), None
+        except Exception as e:
+            return None, e
+
+    async def flush_fetched():
+        """Analyses the buffered symbols in one parallel_engine call and returns their events."""
+        nonlocal fetched
+        batch, batch_error = await evaluate_fetched(fetched)
+        events = []
+        for fetched_symbol, fetched_df, fetched_error in fetched:
+            symbol_error = batch_error if fetched_df is not None else None
+            symbol_batch = batch if fetched_df is not None else None
+            events.extend(finish(fetched_symbol, symbol_batch, symbol_error, fetched_error))
+        fetched = []
+        return events
+
+    fetched = []        # symbols waiting for the next parallel_engine batch
+    stats = FetchStats()
+    idle = ENGINE_IDLE_S if parallel_engine is not None else None
+    async for window in with_idle(load_windows(api_client, jobs, stats), idle):
+        if window is None:
+            # Fetches have stalled (rate limit): analyse what is buffered instead of waiting for a full batch
+            if fetched:
+                for event in await flush_fetched():
+                    yield event
+                if first_result is None:
+                    first_result = time.monotonic() - started
+            continue
+        symbol, hist_df, error_msg = window
+        done += 1
+
+        # Emit Progress (in order of completion)
+        yield {
+            "type": "progress",
+            "value": done / total * 100,
+            "message": f"Processing {symbol} ({done}/{total})...",
+            "current_symbol": symbol
+        }
+
+        if parallel_engine is not None:
+            # Symbols are analysed in batches, so the worker processes each get a share
+            fetched.append((symbol, hist_df, error_msg))
+            if len(fetched) < ENGINE_BATCH and done < total:
+                continue
+            for event in await flush_fetched():
+                yield event
+        else:
+            batch = None
+            batch_error = None
+            if hist_df is not None:
+                try:
+                    # CPU work on the engine worker: the remaining fetches keep going meanwhile
+                    batch = await asyncio.get_running_loop().run_in_executor(
+                        engine_executor, analyse_symbol, symbol, hist_df, signals_df.loc[rows_by_symbol[symbol]])
+                except Exception as e:
+                    batch_error = e
+            for event in finish(symbol, batch, batch_error, error_msg):
+                yield event
+        if first_result is None:
+            first_result = time.monotonic() - started
+
+    # Final Result - Sort by Quality
+    sort_by_quality(valid_trades)
+
+    complete = {
+        "type": "complete",
+        "valid_count": len(valid_trades),
+        "rejected_count": len(rejected_trades),
+        "valid_trades": valid_trades,
+        "failed_symbols": failed_symbols,
+        "throughput": stats.summary(api_client.rate_limiter),
+        "timing": {
+            "time_to_first_result_s": round(first_result, 2) if first_result is not None else None,
+            "wall_s": round(time.monotonic() - started, 2),
+        },
+    }
+    if range_mode:
+        complete["days"] = [
+            {"date": day, "valid_count": len(res['valid']), "rejected_count": res['rejected']}
+            for day, res in sorted(day_results.items())
+        ]
+    yield complete
+
+def completed_symbols(events):
+    """
+    {symbol: results} from the 'symbol_done' events of a run, for run_events(completed=...).
+    Symbols that failed are left out, so a resumed run fetches them again.
+    """
+    return {event['symbol']: event['results'] for event in events
+            if event.get('type') == 'symbol_done' and not event.get('failed')}
@@ -0,0 +1,105 @@
+"""
+Benchmark of the engine on a synthetic universe: the default /run-backtest path
+(analyse_symbol, one symbol at a time), packed in-process, and ParallelEngine with
+1..N worker processes fed ENGINE_BATCH symbols per call, as run_events does.
+
+    python bench_parallel.py --symbols 2000 --sessions 10 --max-workers 8
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import backtest_runner
+
+from backtest_engine import IncrementalIndicators
+from backtest_runner import ENGINE_BATCH, analyse_symbol
+from parallel_engine import ParallelEngine, evaluate_block, pack_frames
+from trading_calendar import CALENDAR, SLOTS
+
+
+def synthetic_universe(n_symbols, sessions, seed=0):
+    """Random-walk 15-minute candles for n_symbols, plus one signal per symbol on the last day."""
+    rng = np.random.default_rng(seed)
+    days = CALENDAR.sessions[CALENDAR.position(pd.Timestamp.now().date()) - sessions + 1:][:sessions]
+    bar_times = (days.astype('datetime64[m]')[:, None] + SLOTS[None, :].astype('timedelta64[m]')).ravel()
+    dates = pd.DatetimeIndex(bar_times.astype('datetime64[ns]')).tz_localize('+05:30')
+
+    frames = {}
+    signals = []
+    for k in range(n_symbols):
+        symbol = f"SYM{k:05d}"
+        close = 100 * np.cumprod(1 + rng.normal(0.0004, 0.003, len(dates)))
+        frames[symbol] = pd.DataFrame({
+            'date': dates, 'open': close, 'high': close * 1.002, 'low': close * 0.998,
+            'close': close, 'volume': rng.integers(1_000, 100_000, len(dates)),
+        })
+        signals.append({
+            'tradingsymbol': symbol,
+            'date': f"{days[-1]}T18:30:00.000Z",
+            'close': close[-1] * (1 + rng.normal(0, 0.005)),
+            'ltp': close[-1], 'is_stage2': bool(rng.random() < 0.8),
+            'stop_loss': 0, 'next_target': 0, 'appearance': [True, False],
+        })
+    return frames, pd.DataFrame(signals)
+
+
+def per_symbol(frames, signals_df):
+    """analyse_symbol per symbol, starting from empty indicator state."""
+    backtest_runner.indicators = IncrementalIndicators()
+    results = []
+    for symbol, df in frames.items():
+        results.append(analyse_symbol(symbol, df.copy(), signals_df[signals_df['tradingsymbol'] == symbol]))
+    return pd.concat(results).reindex(signals_df.index)
+
+
+def batched(engine, frames, signals_df, batch):
+    """engine.evaluate over consecutive chunks of `batch` symbols."""
+    symbols = list(frames)
+    results = []
+    for start in range(0, len(symbols), batch):
+        chunk = {symbol: frames[symbol] for symbol in symbols[start:start + batch]}
+        results.append(engine.evaluate(chunk, signals_df[signals_df['tradingsymbol'].isin(chunk)]))
+    return pd.concat(results).reindex(signals_df.index)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=2000)
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch', type=int, default=ENGINE_BATCH)
+    args = parser.parse_args()
+
+    frames, signals_df = synthetic_universe(args.symbols, args.sessions)
+    bars = sum(len(df) for df in frames.values())
+    print(f"{args.symbols} symbols, {bars} bars, {len(signals_df)} signals, {os.cpu_count()} CPUs")
+
+    baseline, expected = timed(per_symbol, frames, signals_df)
+    print(f"{'analyse_symbol per symbol':<28}{baseline:8.3f}s")
+    elapsed, result = timed(lambda: evaluate_block(*pack_frames(frames), signals_df))
+    print(f"{'packed (in-process)':<28}{elapsed:8.3f}s  x{baseline / elapsed:5.1f}")
+    assert (result['reason'] == expected['reason']).all()
+
+    for workers in range(1, args.max_workers + 1):
+        engine = ParallelEngine(workers)
+        batched(engine, frames, signals_df, args.batch)  # warm-up: start the worker processes
+        elapsed, result = timed(batched, engine, frames, signals_df, args.batch)
+        engine.shutdown()
+        assert (result['reason'] == expected['reason']).all()
+        print(f"{f'process pool, {workers} worker(s)':<28}{elapsed:8.3f}s  x{baseline / elapsed:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
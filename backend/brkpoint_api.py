@@ -1,22 +1,96 @@
-import requests
+import os
+import json
 import pandas as pd
+from datetime import datetime
+
+from candle_cache import IST
+from http_pool import session
+from trading_calendar import SESSION_CLOSE
 
 API_URL = "https://brkpoint.in/api/smc-scanner/signals"
+REQUEST_TIMEOUT = (5, 20)  # connect, read (seconds)
+
+# A past date's signals are final once fetched after that session closed; they are
+# then kept on disk for good. Anything else (today, a snapshot taken during the
+# session, an empty answer) is refetched when the cached copy is older than TODAY_TTL.
+SIGNAL_CACHE_DIR = "signal_cache"
+TODAY_TTL = 120
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def parse_date(date_str):
+    """The date of a YYYY-MM-DD string; raises ValueError for anything else."""
+    try:
+        return datetime.strptime(date_str, DATE_FORMAT).date()
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date {date_str!r}, expected YYYY-MM-DD")
+
+
+def _cache_path(day):
+    return os.path.join(SIGNAL_CACHE_DIR, f"{day.strftime(DATE_FORMAT)}.json")
+
+
+def _read_cache(day):
+    """Cached {'fetched_at', 'results'} for day, or None. fetched_at is naive IST."""
+    try:
+        with open(_cache_path(day)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict):
+        # Older files hold only the results, with no fetch time: never final
+        return {'fetched_at': None, 'results': entry}
+    fetched_at = entry.get('fetched_at')
+    entry['fetched_at'] = datetime.fromisoformat(fetched_at) if fetched_at else None
+    return entry
+
+
+def _is_fresh(entry, day, now):
+    if entry is None or entry['fetched_at'] is None:
+        return False
+    # Fetched after the session closed, with signals in it: final
+    if entry['results'] and entry['fetched_at'] >= datetime.combine(day, SESSION_CLOSE):
+        return True
+    return (now - entry['fetched_at']).total_seconds() <= TODAY_TTL
+
+
+def _write_cache(day, results, fetched_at):
+    os.makedirs(SIGNAL_CACHE_DIR, exist_ok=True)
+    path = _cache_path(day)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'fetched_at': fetched_at.isoformat(), 'results': results}, f)
+    os.replace(tmp_path, path)
+
 
 def fetch_signals(date_str):
     """
-    Fetches signals for a specific date (YYYY-MM-DD).
+    Fetches signals for a specific date (YYYY-MM-DD); raises ValueError for any other string.
+    A past date fetched after its session closed is served from the local signal
+    cache; other cached copies are reused while younger than TODAY_TTL.
     Returns a DataFrame of signals or None if failed.
     """
+    day = parse_date(date_str)
+    now = datetime.now(IST).replace(tzinfo=None)
+    cached = _read_cache(day)
+    if _is_fresh(cached, day, now):
+        return pd.DataFrame(cached['results'])
+
     try:
-        url = f"{API_URL}?date={date_str}"
-        response = requests.get(url)
+        url = f"{API_URL}?date={day.strftime(DATE_FORMAT)}"
+        response = session.get(url, timeout=REQUEST_TIMEOUT)
         if response.status_code == 200:
             data = response.json()
             if 'results' in data:
+                if day <= now.date():
+                    _write_cache(day, data['results'], now)
                 return pd.DataFrame(data['results'])
         print(f"Failed to fetch signals: {response.status_code}")
-        return None
     except Exception as e:
         print(f"Error fetching signals: {e}")
-        return None
+
+    # Better a stale copy than no signals at all
+    if cached is not None:
+        print(f"Using cached signals for {date_str}")
+        return pd.DataFrame(cached['results'])
+    return None
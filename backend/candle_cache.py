@@ -0,0 +1,180 @@
+import os
+import pickle
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import CALENDAR
+
+CANDLE_CACHE_DIR = "candle_cache"
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+IST = timezone(timedelta(hours=5, minutes=30))
+MINUTE = timedelta(minutes=1)
+
+
+def now_ist():
+    return datetime.now(IST).replace(tzinfo=None)
+
+
+def to_naive_ist(dates):
+    """Candle timestamps as naive IST, to compare with the naive request bounds."""
+    if dates.dt.tz is not None:
+        return dates.dt.tz_convert(IST).dt.tz_localize(None)
+    return dates
+
+
+def index_by_time(df, dates=None):
+    """
+    Returns df with a sorted DatetimeIndex of naive IST bar times ('bar_time'), so bars
+    can be located by binary search. The 'date' column is kept as it is.
+    """
+    if df is None:
+        return df
+    if dates is None:
+        dates = to_naive_ist(df['date'])
+    df = df.set_axis(pd.DatetimeIndex(dates, name='bar_time'), axis=0)
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind='stable')
+    return df
+
+
+def close_arrays(df, since=None):
+    """
+    (bar times as int64 ns naive IST, closes) of a date-sorted candle frame, from the
+    first bar at or after `since` (int64 ns). Plain arrays, for callers that go
+    through many frames per pass.
+    """
+    # Positional access: a label lookup builds a hash table on every freshly unpickled frame
+    names = list(df.columns)
+    dates = df.iloc[:, names.index('date')].array
+    if dates.tz is not None:
+        dates = dates.tz_convert(IST).tz_localize(None)
+    times = dates.as_unit('ns').asi8
+    closes = df.iloc[:, names.index('close')].to_numpy(dtype=float)
+    start = np.searchsorted(times, since) if since is not None else 0
+    return times[start:], closes[start:]
+
+
+def _merge(intervals):
+    """Sorted, disjoint union of [start, end) intervals (touching ones are joined)."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _coverage(entry):
+    """Covered [start, end) intervals of a cache entry; older files hold a single window."""
+    if 'coverage' in entry:
+        return entry['coverage']
+    return [(entry['covered_from'], entry['covered_to'])]
+
+
+class CandleCache:
+    """
+    On-disk store of historical candles, one file per (token, interval).
+
+    Each file holds the bars plus the [start, end) intervals that have been fetched
+    from the API. Past candles never change, so any request inside those intervals
+    is served locally; only the parts outside them are fetched. Coverage never
+    extends past the start of today (IST), so the current session is always
+    refetched until it has closed.
+    """
+
+    def __init__(self, root=CANDLE_CACHE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, token, interval):
+        return os.path.join(self.root, interval, f"{token}.pkl")
+
+    def _load(self, token, interval):
+        try:
+            with open(self._path(token, interval), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def modified(self, token, interval):
+        """Modification time of the (token, interval) file, or None if nothing is cached."""
+        try:
+            return os.path.getmtime(self._path(token, interval))
+        except OSError:
+            return None
+
+    def closes(self, token, interval, since=None):
+        """close_arrays() of the cached bars of (token, interval), or None if nothing is held."""
+        entry = self._load(token, interval)
+        if entry is None or entry['df'] is None or entry['df'].empty:
+            return None
+        # store() keeps the bars sorted by date
+        return close_arrays(entry['df'], since)
+
+    def missing_ranges(self, token, interval, from_date, to_date):
+        """
+        Returns the (from, to) string ranges that must be fetched from the API so the
+        cache covers [from_date, to_date]: the window minus what is already covered.
+        A gap with no trading bars in it (weekend, holiday, after the close) is skipped.
+        """
+        start = datetime.strptime(from_date, DATE_FORMAT)
+        # Bounds are inclusive to the minute
+        end = datetime.strptime(to_date, DATE_FORMAT) + MINUTE
+        entry = self._load(token, interval)
+        coverage = _coverage(entry) if entry is not None else []
+
+        gaps = []
+        cursor = start
+        for covered_from, covered_to in coverage:
+            if covered_to <= cursor:
+                continue
+            if covered_from >= end:
+                break
+            if covered_from > cursor:
+                gaps.append((cursor, covered_from))
+            cursor = max(cursor, covered_to)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return [(gap_from.strftime(DATE_FORMAT), (gap_to - MINUTE).strftime(DATE_FORMAT))
+                for gap_from, gap_to in gaps if CALENDAR.bars_between(gap_from, gap_to, interval)]
+
+    def store(self, token, interval, df, from_date, to_date):
+        """Merges freshly fetched bars for [from_date, to_date] into the cache."""
+        start = datetime.strptime(from_date, DATE_FORMAT)
+        end = min(datetime.strptime(to_date, DATE_FORMAT) + MINUTE,
+                  now_ist().replace(hour=0, minute=0, second=0, microsecond=0))
+
+        with self._lock:
+            entry = self._load(token, interval)
+            coverage = _coverage(entry) if entry is not None else []
+            if start < end:
+                coverage = _merge(coverage + [(start, end)])
+            frames = [f for f in (entry['df'] if entry else None, df) if f is not None and not f.empty]
+            merged = pd.concat(frames, ignore_index=True) if frames else df
+            if merged is not None and not merged.empty:
+                merged = (merged.drop_duplicates(subset='date', keep='last')
+                          .sort_values('date')
+                          .reset_index(drop=True))
+            entry = {'coverage': coverage, 'df': merged}
+
+            path = self._path(token, interval)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+
+    def get(self, token, interval, from_date, to_date):
+        """Cached bars within [from_date, to_date], indexed by bar time, or None if nothing is held."""
+        entry = self._load(token, interval)
+        if entry is None or entry['df'] is None or entry['df'].empty:
+            return None
+        df = entry['df']
+        dates = to_naive_ist(df['date'])
+        mask = (dates >= datetime.strptime(from_date, DATE_FORMAT)) & \
+               (dates <= datetime.strptime(to_date, DATE_FORMAT))
+        return index_by_time(df[mask], dates[mask])
@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from candle_cache import DATE_FORMAT, now_ist, index_by_time, to_naive_ist
+
+# pyarrow is optional: without it the warehouse is disabled and callers fall back to the API
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+WAREHOUSE_DIR = "candle_warehouse"
+# A month partition is compacted into one file once it holds this many parts
+COMPACT_PARTS = 8
+
+
+def _months(start, end):
+    """YYYY-MM strings for every month touching [start, end]."""
+    return [p.strftime("%Y-%m") for p in pd.period_range(start, end, freq='M')]
+
+
+class CandleWarehouse:
+    """
+    Durable, columnar OHLCV history in Parquet.
+
+    Layout: <root>/interval=<I>/symbol=<S>/month=<YYYY-MM>/part-<ns>.parquet
+    Only closed sessions are stored. Writes are append-only (a new part file per
+    write, compacted every COMPACT_PARTS parts); readers merge the parts of the
+    months they need and keep the newest copy of any duplicated bar.
+    Reads memory-map the files and hand Arrow buffers to pandas without copying
+    where the column types allow it.
+    """
+
+    def __init__(self, root=WAREHOUSE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return pq is not None
+
+    def _month_dir(self, symbol, interval, month):
+        return os.path.join(self.root, f"interval={interval}", f"symbol={symbol}", f"month={month}")
+
+    def append(self, symbol, interval, df):
+        """
+        Appends bars to the warehouse, one new part file per month touched. Bars of
+        today's session (IST) are left out: they are still changing.
+        """
+        if not self.enabled or df is None or df.empty:
+            return
+        dates = to_naive_ist(df['date'])
+        closed = dates < now_ist().replace(hour=0, minute=0, second=0, microsecond=0)
+        df = df.loc[closed.values, ['date', 'open', 'high', 'low', 'close', 'volume']]
+        if df.empty:
+            return
+        months = dates[closed].dt.strftime("%Y-%m")
+        with self._lock:
+            for month, part in df.groupby(months.values):
+                month_dir = self._month_dir(symbol, interval, month)
+                os.makedirs(month_dir, exist_ok=True)
+                path = os.path.join(month_dir, f"part-{time.time_ns()}.parquet")
+                tmp_path = path + ".tmp"
+                table = pa.Table.from_pandas(part.reset_index(drop=True), preserve_index=False)
+                pq.write_table(table, tmp_path)
+                os.replace(tmp_path, path)
+        for month in months.unique():
+            if len(list(self._part_files(symbol, interval, [month]))) >= COMPACT_PARTS:
+                self.compact(symbol, interval, month)
+
+    def _part_files(self, symbol, interval, months):
+        for month in months:
+            month_dir = self._month_dir(symbol, interval, month)
+            if not os.path.isdir(month_dir):
+                continue
+            for name in sorted(os.listdir(month_dir)):
+                if name.endswith(".parquet"):
+                    yield os.path.join(month_dir, name)
+
+    def read(self, symbol, interval, from_date, to_date):
+        """Bars for symbol within [from_date, to_date] ("YYYY-MM-DD HH:MM"), indexed by bar time, or None."""
+        if not self.enabled:
+            return None
+        start = datetime.strptime(from_date, DATE_FORMAT)
+        end = datetime.strptime(to_date, DATE_FORMAT)
+        # Part files sort by write time, so keep='last' below keeps the newest bar
+        try:
+            tables = [pq.read_table(path, memory_map=True)
+                      for path in self._part_files(symbol, interval, _months(start, end))]
+        except OSError:
+            # A part removed by a concurrent compact(): let the caller fall back to the API
+            return None
+        if not tables:
+            return None
+        df = pa.concat_tables(tables).to_pandas(split_blocks=True, self_destruct=True)
+        df = df.drop_duplicates(subset='date', keep='last').sort_values('date')
+        dates = to_naive_ist(df['date'])
+        mask = (dates >= start) & (dates <= end)
+        return index_by_time(df[mask], dates[mask])
+
+    def compact(self, symbol, interval, month):
+        """Rewrites one month partition as a single part file, dropping superseded bars."""
+        if not self.enabled:
+            return
+        with self._lock:
+            paths = list(self._part_files(symbol, interval, [month]))
+            if len(paths) < 2:
+                return
+            df = pa.concat_tables([pq.read_table(p) for p in paths]).to_pandas()
+            df = df.drop_duplicates(subset='date', keep='last').sort_values('date')
+            path = os.path.join(self._month_dir(symbol, interval, month), f"part-{time.time_ns()}.parquet")
+            pq.write_table(pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False), path + ".tmp")
+            os.replace(path + ".tmp", path)
+            for old in paths:
+                os.remove(old)
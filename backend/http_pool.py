@@ -0,0 +1,89 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+# One keep-alive connection pool per host, shared by the signal fetcher, the scrip
+# master download and the SmartAPI client. requests speaks HTTP/1.1 only, so reuse
+# comes from keep-alive pooling rather than HTTP/2 multiplexing.
+DEFAULT_TIMEOUT = (5, 30)  # connect, read (seconds)
+POOL_HOSTS = 10            # hosts with a pool kept open
+POOL_MAXSIZE = 16          # open connections kept per host (>= concurrent fetches)
+
+
+class ConnectionStats:
+    """Per-host request and new-connection counters; the difference is keep-alive reuse."""
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def record(self, host, field):
+        with self._lock:
+            counts = self._hosts.setdefault(host, {'requests': 0, 'connections': 0})
+            counts[field] += 1
+
+    def snapshot(self):
+        with self._lock:
+            hosts = {host: dict(counts) for host, counts in self._hosts.items()}
+        for counts in hosts.values():
+            counts['reused'] = max(counts['requests'] - counts['connections'], 0)
+            counts['reuse_pct'] = round(100 * counts['reused'] / counts['requests'], 1) if counts['requests'] else 0.0
+        return hosts
+
+
+STATS = ConnectionStats()
+
+
+class _CountingPoolMixin:
+    def _new_conn(self):
+        STATS.record(self.host, 'connections')
+        return super()._new_conn()
+
+    def urlopen(self, *args, **kwargs):
+        STATS.record(self.host, 'requests')
+        return super().urlopen(*args, **kwargs)
+
+
+class CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class CountingAdapter(HTTPAdapter):
+    """HTTPAdapter whose per-host pools report to STATS."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool,
+        }
+
+
+class PooledSession(requests.Session):
+    """requests.Session with pooled, counted connections and a default timeout."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        adapter = CountingAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_MAXSIZE)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+# Process-wide session: reusing it is what keeps connections alive between calls
+session = PooledSession()
+
+
+def connection_stats():
+    return STATS.snapshot()
@@ -0,0 +1,224 @@
+import numpy as np
+import pandas as pd
+
+# Registry of indicator name -> Indicator. Kernels work on stacked (symbols x bars)
+# float arrays, left-padded with NaN where a symbol has fewer bars, so one call
+# computes an indicator for the whole universe.
+INDICATORS = {}
+
+# Indicators the setup rules currently use
+ACTIVE_INDICATORS = ('EMA_9', 'EMA_20')
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class Indicator:
+    """A registered indicator: kernel, the input fields it reads and its warm-up in bars."""
+    __slots__ = ('name', 'kernel', 'inputs', 'lookback', 'params')
+
+    def __init__(self, name, kernel, inputs, lookback, params):
+        self.name = name
+        self.kernel = kernel
+        self.inputs = inputs
+        self.lookback = lookback
+        self.params = params
+
+    def compute(self, stacked):
+        """Returns {column name: (symbols x bars) array}."""
+        out = self.kernel(*(stacked[field] for field in self.inputs), **self.params)
+        return out if isinstance(out, dict) else {self.name: out}
+
+
+def register(name, kernel, inputs, lookback, **params):
+    INDICATORS[name] = Indicator(name, kernel, inputs, lookback, params)
+
+
+def required_bars(names=ACTIVE_INDICATORS):
+    """Bars of history the given indicators need before their values can be trusted."""
+    return max(INDICATORS[name].lookback for name in names)
+
+
+# --- Kernels ---
+
+def _ewm(x, alpha, seed=None):
+    """
+    Recursive EWM (pandas adjust=False) along the bar axis, seeded at each row's first
+    value, or continuing from seed (one previous value per row, NaN to start afresh).
+    """
+    if x.shape[0] == 1:
+        out = _ewm_row(x[0], alpha, np.nan if seed is None else float(seed[0]))
+        if out is not None:
+            return out[None, :]
+    out = np.full_like(x, np.nan)
+    prev = np.full(x.shape[0], np.nan) if seed is None else np.array(seed, dtype=float)
+    for t in range(x.shape[1]):
+        xt = x[:, t]
+        # Same arithmetic as pandas' ewm, so a stacked row and a single frame agree bit for bit
+        step = np.where(prev == xt, xt, ((1 - alpha) * prev + alpha * xt) / ((1 - alpha) + alpha))
+        prev = np.where(np.isnan(prev), xt, step)
+        out[:, t] = prev
+    return out
+
+
+def _ewm_row(x, alpha, seed):
+    """
+    _ewm of a single row through pandas' compiled ewm, which is much faster than the
+    loop for one long frame. Returns None for rows with gaps, which the loop handles.
+    """
+    valid = ~np.isnan(x)
+    first = int(valid.argmax())
+    if not valid[first:].all() or (first and not np.isnan(seed)):
+        return None
+    out = np.full_like(x, np.nan)
+    if np.isnan(seed):
+        values = x[first:]
+    else:
+        values = np.concatenate([[seed], x])
+    smoothed = pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    out[first:] = smoothed if np.isnan(seed) else smoothed[1:]
+    return out
+
+
+def ema(close, span, seed=None):
+    return _ewm(close, 2 / (span + 1), seed)
+
+
+def sma(x, n):
+    valid = ~np.isnan(x)
+    csum = np.cumsum(np.where(valid, x, 0.0), axis=1)
+    ccount = np.cumsum(valid, axis=1)
+    prev_sum = np.zeros_like(csum)
+    prev_count = np.zeros_like(ccount)
+    prev_sum[:, n:] = csum[:, :-n]
+    prev_count[:, n:] = ccount[:, :-n]
+    window_count = ccount - prev_count
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = (csum - prev_sum) / window_count
+    out[window_count < n] = np.nan
+    return out
+
+
+def _prev(x):
+    out = np.full_like(x, np.nan)
+    out[:, 1:] = x[:, :-1]
+    return out
+
+
+def rsi(close, n):
+    delta = close - _prev(close)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    # Keep the padding (and the first bar, which has no delta) out of the averages
+    gain[np.isnan(delta)] = np.nan
+    loss[np.isnan(delta)] = np.nan
+    avg_gain = _ewm(gain, 1 / n)
+    avg_loss = _ewm(loss, 1 / n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = 100 - 100 / (1 + avg_gain / avg_loss)
+    out[(avg_loss == 0) & (avg_gain > 0)] = 100.0
+    return out
+
+
+def true_range(high, low, close):
+    prev_close = _prev(close)
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return tr
+
+
+def atr(high, low, close, n):
+    return _ewm(true_range(high, low, close), 1 / n)
+
+
+def vwap(high, low, close, volume, session):
+    """Session VWAP: cumulative typical price x volume, reset at each session start."""
+    typical = (high + low + close) / 3
+    pv = np.where(np.isnan(typical), 0.0, typical * np.nan_to_num(volume))
+    vol = np.nan_to_num(volume)
+    cpv = np.cumsum(pv, axis=1)
+    cvol = np.cumsum(vol, axis=1)
+
+    bars = np.arange(session.shape[1])
+    starts = np.ones_like(session, dtype=bool)
+    starts[:, 1:] = session[:, 1:] != session[:, :-1]
+    # Index of the first bar of the current session, per cell
+    start_idx = np.maximum.accumulate(np.where(starts, bars, 0), axis=1)
+    base_pv = np.where(start_idx > 0, np.take_along_axis(cpv, np.maximum(start_idx - 1, 0), axis=1), 0.0)
+    base_vol = np.where(start_idx > 0, np.take_along_axis(cvol, np.maximum(start_idx - 1, 0), axis=1), 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = (cpv - base_pv) / (cvol - base_vol)
+    out[np.isnan(typical)] = np.nan
+    return out
+
+
+def supertrend(high, low, close, period, multiplier):
+    """Supertrend line and direction (+1 up, -1 down)."""
+    band = multiplier * atr(high, low, close, period)
+    hl2 = (high + low) / 2
+    basic_upper = hl2 + band
+    basic_lower = hl2 - band
+
+    n_sym, n_bars = close.shape
+    upper = np.full(n_sym, np.nan)
+    lower = np.full(n_sym, np.nan)
+    direction = np.ones(n_sym)
+    prev_close = np.full(n_sym, np.nan)
+    line_out = np.full_like(close, np.nan)
+    dir_out = np.full_like(close, np.nan)
+    for t in range(n_bars):
+        bu, bl, c = basic_upper[:, t], basic_lower[:, t], close[:, t]
+        # Bands only tighten while price stays inside them
+        upper = np.where(np.isnan(upper) | (bu < upper) | (prev_close > upper), bu, upper)
+        lower = np.where(np.isnan(lower) | (bl > lower) | (prev_close < lower), bl, lower)
+        direction = np.where(c > upper, 1.0, np.where(c < lower, -1.0, direction))
+        line_out[:, t] = np.where(direction > 0, lower, upper)
+        dir_out[:, t] = np.where(np.isnan(c), np.nan, direction)
+        prev_close = c
+    line_out[np.isnan(close)] = np.nan
+    return {f'SUPERTREND_{period}_{multiplier}': line_out, f'SUPERTREND_{period}_{multiplier}_DIR': dir_out}
+
+
+# --- Registry ---
+# lookback: bars of warm-up before values are reliable (recursive smoothers ~3x their span)
+register('EMA_9', ema, ('close',), 27, span=9)
+register('EMA_20', ema, ('close',), 60, span=20)
+register('RSI_14', rsi, ('close',), 42, n=14)
+register('ATR_14', atr, ('high', 'low', 'close'), 42, n=14)
+register('VWAP', vwap, ('high', 'low', 'close', 'volume', 'session'), 1)
+register('SUPERTREND_10_3', supertrend, ('high', 'low', 'close'), 30, period=10, multiplier=3)
+register('VOLUME_SMA_20', sma, ('volume',), 20, n=20)
+
+
+# --- Stacking ---
+
+def stack_frames(frames):
+    """
+    Stacks per-symbol candle frames into (symbols x bars) arrays, right-aligned on the
+    latest bar and left-padded with NaN. Returns (symbols, stacked) where stacked maps
+    each OHLCV field, 'session' (day number) and 'time' (ns) to a 2D array.
+    """
+    symbols = list(frames)
+    width = max((len(df) for df in frames.values()), default=0)
+    stacked = {field: np.full((len(symbols), width), np.nan) for field in FIELDS}
+    stacked['session'] = np.full((len(symbols), width), -1, dtype=np.int64)
+    stacked['time'] = np.full((len(symbols), width), np.iinfo(np.int64).min, dtype=np.int64)
+    for row, symbol in enumerate(symbols):
+        df = frames[symbol]
+        if df is None or df.empty:
+            continue
+        cols = slice(width - len(df), width)
+        for field in FIELDS:
+            stacked[field][row, cols] = df[field].to_numpy(dtype=float)
+        dates = pd.DatetimeIndex(df['date'])
+        if dates.tz is not None:
+            dates = dates.tz_localize(None)
+        stacked['time'][row, cols] = dates.as_unit('ns').asi8
+        stacked['session'][row, cols] = dates.normalize().as_unit('ns').asi8 // 86_400_000_000_000
+    return symbols, stacked
+
+
+def compute(stacked, names=ACTIVE_INDICATORS):
+    """Computes the named indicators over stacked arrays: {column: (symbols x bars) array}."""
+    out = {}
+    for name in names:
+        out.update(INDICATORS[name].compute(stacked))
+    return out
@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+
+from backtest_engine import RULESET_VERSION
+from backtest_runner import INTERVAL, backtest_dates, completed_symbols, run_events
+from candle_cache import IST
+
+# One directory per job: meta.json (payload, status) and events.ndjson (the event stream)
+JOBS_DIR = "jobs"
+
+# Job states. 'interrupted' is a job found 'running' on disk after a restart.
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+INTERRUPTED = 'interrupted'
+RESUMABLE = (FAILED, CANCELLED, INTERRUPTED)
+
+# Finished runs by key, reused instead of recomputed (past dates only)
+RESULTS_INDEX = "results.json"
+# Finished jobs kept in memory (most recently used); older ones are reloaded from disk
+MAX_CACHED_JOBS = 32
+
+
+def run_key(payload):
+    """
+    Identity of a run: its trading days, the rule-set version and the candle interval.
+    None for a payload without valid dates.
+    """
+    try:
+        return json.dumps([backtest_dates(payload), RULESET_VERSION, INTERVAL])
+    except ValueError:
+        return None
+
+
+def is_final(payload):
+    """True if every day of the run is in the past, so its result can never change."""
+    today = datetime.now(IST).strftime("%Y-%m-%d")
+    try:
+        return all(day < today for day in backtest_dates(payload))
+    except ValueError:
+        return False
+
+
+class Job:
+    """
+    A backtest running in the background, independent of any HTTP connection.
+    Every event is appended to events.ndjson as it happens, so clients can attach at
+    any offset, detach and re-attach, and a failed or cancelled run can be resumed.
+    """
+
+    def __init__(self, job_id, payload, root=JOBS_DIR):
+        self.id = job_id
+        self.payload = payload
+        self.dir = os.path.join(root, job_id)
+        self.status = RUNNING
+        self.created = time.time()
+        self.updated = self.created
+        self.events = []        # NDJSON lines, without the newline
+        self.task = None
+        self.torn_log = False   # events.ndjson ends in a partial line (see load)
+        self._wakeup = asyncio.Event()
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    @property
+    def reusable(self):
+        """Completed with every symbol fetched and analysed, so the result can be replayed."""
+        if self.status != COMPLETED or not self.events:
+            return False
+        complete = json.loads(self.events[-1])
+        return complete.get('type') == 'complete' and complete.get('failed_symbols') == 0
+
+    def info(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'payload': self.payload,
+            'created': self.created,
+            'updated': self.updated,
+            'events': len(self.events),
+        }
+
+    def _write_meta(self):
+        os.makedirs(self.dir, exist_ok=True)
+        path = os.path.join(self.dir, "meta.json")
+        with open(path + ".tmp", 'w') as f:
+            json.dump(self.info(), f)
+        os.replace(path + ".tmp", path)
+
+    def _set_status(self, status):
+        self.status = status
+        self.updated = time.time()
+        self._write_meta()
+        self._notify()
+
+    def _notify(self):
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    def _append(self, log, event):
+        line = json.dumps(event)
+        log.write(line + "\n")
+        log.flush()
+        self.events.append(line)
+        self._notify()
+
+    async def _run(self):
+        completed = completed_symbols(json.loads(line) for line in self.events)
+        last_type = None
+        os.makedirs(self.dir, exist_ok=True)
+        path = os.path.join(self.dir, "events.ndjson")
+        if self.torn_log:
+            # Rewrite without the partial line, so new events start on a line of their own
+            with open(path + ".tmp", 'w') as log:
+                log.writelines(line + "\n" for line in self.events)
+            os.replace(path + ".tmp", path)
+            self.torn_log = False
+        with open(path, 'a') as log:
+            try:
+                async for event in run_events(self.payload, completed):
+                    last_type = event['type']
+                    self._append(log, event)
+                self._set_status(COMPLETED if last_type == 'complete' else FAILED)
+            except asyncio.CancelledError:
+                self._append(log, {"type": "error", "message": "Job cancelled"})
+                self._set_status(CANCELLED)
+            except Exception as e:
+                self._append(log, {"type": "error", "message": f"Critical Error: {str(e)}"})
+                self._set_status(FAILED)
+
+    def start(self):
+        self.status = RUNNING
+        self._write_meta()
+        self.task = asyncio.create_task(self._run())
+
+    async def follow(self, offset=0):
+        """Yields event lines from offset on, waiting for new ones while the job runs."""
+        while True:
+            wakeup = self._wakeup
+            while offset < len(self.events):
+                yield self.events[offset]
+                offset += 1
+            if not self.running:
+                return
+            await wakeup.wait()
+
+    @classmethod
+    def load(cls, job_id, root=JOBS_DIR):
+        """Reads a job back from disk, or None if there is no such job."""
+        job_dir = os.path.join(root, job_id)
+        try:
+            with open(os.path.join(job_dir, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls(job_id, meta['payload'], root)
+        job.created = meta.get('created', job.created)
+        job.updated = meta.get('updated', job.updated)
+        job.status = meta.get('status', FAILED)
+        if job.status == RUNNING:
+            job.status = INTERRUPTED
+        try:
+            with open(os.path.join(job_dir, "events.ndjson")) as f:
+                # A torn last line (crash mid-write) is dropped
+                for line in f:
+                    if line.endswith("\n"):
+                        job.events.append(line.rstrip("\n"))
+                    else:
+                        job.torn_log = True
+        except OSError:
+            pass
+        return job
+
+
+class JobManager:
+    """
+    Creates, finds, cancels and resumes jobs. Jobs outlive the requests that start them.
+
+    Runs are memoized by run_key: a request identical to a running job subscribes to
+    it, and one identical to a completed past-dated job in which no symbol failed
+    replays its stored result.
+    """
+
+    def __init__(self, root=JOBS_DIR):
+        self.root = root
+        self._jobs = OrderedDict()     # job id -> job: running ones plus recently used finished ones
+        self._inflight = {}     # run key -> running job
+        self._results = self._load_results()     # run key -> completed job id
+
+    def _load_results(self):
+        try:
+            with open(os.path.join(self.root, RESULTS_INDEX)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_results(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, RESULTS_INDEX)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(self._results, f)
+        os.replace(path + ".tmp", path)
+
+    def _remember(self, job):
+        """Keeps job in memory; finished jobs beyond MAX_CACHED_JOBS are dropped, oldest use first."""
+        self._jobs[job.id] = job
+        self._jobs.move_to_end(job.id)
+        finished = [job_id for job_id, cached in self._jobs.items() if not cached.running]
+        for job_id in finished[:max(0, len(finished) - MAX_CACHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _track(self, job, key):
+        if key is None:
+            return
+        self._inflight[key] = job
+        job.task.add_done_callback(lambda _: self._finished(job, key))
+
+    def _finished(self, job, key):
+        if self._inflight.get(key) is job:
+            del self._inflight[key]
+        # Runs where a fetch failed (throttling, outages) are recomputed, not replayed
+        if job.reusable and is_final(job.payload):
+            self._results[key] = job.id
+            self._save_results()
+
+    def find(self, payload):
+        """A running or reusable completed job for this payload, or None."""
+        key = run_key(payload)
+        if key is None:
+            return None
+        job = self._inflight.get(key)
+        if job is not None and job.running:
+            return job
+        job_id = self._results.get(key)
+        if job_id is not None:
+            job = self.get(job_id)
+            if job is not None and job.reusable:
+                return job
+        return None
+
+    def _valid_id(self, job_id):
+        return job_id.isalnum()
+
+    def create(self, payload):
+        """Returns (job, reused): an identical running/finished job, else a new one."""
+        job = self.find(payload)
+        if job is not None:
+            return job, True
+        job = Job(uuid.uuid4().hex[:12], payload, self.root)
+        job.start()
+        self._remember(job)
+        self._track(job, run_key(payload))
+        return job, False
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None and self._valid_id(job_id):
+            job = Job.load(job_id, self.root)
+        if job is not None:
+            self._remember(job)
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and job.running:
+            job.task.cancel()
+        return job
+
+    def resume(self, job_id):
+        """Restarts a failed, cancelled or interrupted job; completed symbols are skipped."""
+        job = self.get(job_id)
+        if job is not None and not job.running and job.status in RESUMABLE:
+            job.start()
+            self._track(job, run_key(job.payload))
+        return job
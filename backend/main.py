@@ -3,9 +3,6 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 import json
 import asyncio
-from datetime import datetime, timedelta
-import pandas as pd
-import time
 import sys
 import os
 
@@ -13,9 +10,11 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import local modules
-from smart_api_client import SmartApiClient
-from brkpoint_api import fetch_signals
-from backtest_engine import calculate_indicators, validate_setup
+from http_pool import connection_stats
+from backtest_runner import backtest_dates, prepare_client
+from jobs import JobManager
+from rate_limiter import FetchStats
+from scanner import UniverseScanner
 
 app = FastAPI()
 
@@ -28,126 +27,118 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global Client Instance
-client = None
-
-def get_client():
-    global client
-    if client is None:
-        client = SmartApiClient()
-        if not client.login():
-            raise Exception("Failed to login to SmartAPI")
-    return client
+# Backtests run as background jobs; HTTP requests only start, watch or cancel them
+job_manager = JobManager()
+# Setup rules over every NSE equity; EMA state is kept between scans.
+# SCANNER_LOOP=1 also refreshes (within a share of the hourly rate limit) and scans
+# after every 15-minute bar close during market hours.
+scanner = UniverseScanner()
+SCANNER_LOOP = os.environ.get("SCANNER_LOOP") == "1"
+scanner_task = None
+
+@app.on_event("startup")
+async def start_scanner_loop():
+    global scanner_task
+    if SCANNER_LOOP:
+        scanner_task = asyncio.create_task(scanner.run_loop(prepare_client))
 
 @app.get("/")
 def read_root():
     return {"status": "ok", "message": "Swing FFD Backend Running"}
 
+@app.get("/http-stats")
+def http_stats():
+    """Per-host request counts and keep-alive connection reuse of the shared HTTP pool."""
+    return connection_stats()
+
+def create_job(payload):
+    """(job, reused): identical in-flight or finished past-dated runs are shared."""
+    try:
+        backtest_dates(payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job_manager.create(payload)
+
+def find_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def stream_job(job, offset=0, announce=False, reused=False):
+    """NDJSON stream of a job's events from offset; the job keeps running if the client leaves."""
+    async def event_stream():
+        if announce:
+            yield json.dumps({"type": "job", "job_id": job.id, "reused": reused}) + "\n"
+        async for line in job.follow(offset):
+            yield line + "\n"
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 @app.post("/run-backtest")
 async def run_backtest(payload: dict):
     """
     Payload: {"date": "YYYY-MM-DD"}
+         or  {"start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD", "weekdays": [0, 1, 2, 3, 4]}
+    Range mode fetches signals for every selected day and each symbol's candles
+    once for the whole range, then streams per-day and aggregate results.
+    Starts a job and streams it: the first line is {"type": "job", "job_id": ..., "reused": ...},
+    which can be re-attached with /jobs/{job_id}/events if the connection drops.
+    An identical run already in flight is joined, and a finished run over past dates
+    (same rule-set version and interval) is replayed instead of recomputed.
     Returns a Stream of JSON strings.
     """
-    target_date_str = payload.get("date")
-    
-    async def event_generator():
-        try:
-            # 1. Fetch Signals
-            yield json.dumps({"type": "status", "message": f"Fetching signals for {target_date_str}..."}) + "\n"
-            signals_df = fetch_signals(target_date_str)
-            
-            if signals_df is None or signals_df.empty:
-                yield json.dumps({"type": "error", "message": f"No signals found for {target_date_str}"}) + "\n"
-                return
-
-            yield json.dumps({"type": "status", "message": f"Found {len(signals_df)} raw signals. Starting analysis..."}) + "\n"
-            
-            # 2. Init Client
-            try:
-                api_client = get_client()
-            except Exception as e:
-                yield json.dumps({"type": "error", "message": f"SmartAPI Login Failed: {str(e)}"}) + "\n"
-                return
-
-            # 3. Ensure Token Map
-            if api_client.token_map is None:
-                yield json.dumps({"type": "status", "message": "Loading Scrip Master (this may take a moment)..."}) + "\n"
-                api_client.load_scrip_master()
-
-            total = len(signals_df)
-            valid_trades = []
-            rejected_trades = []
-
-            for i, row in signals_df.iterrows():
-                symbol = row['tradingsymbol']
-                
-                # Emit Progress
-                progress = (i + 1) / total * 100
-                yield json.dumps({
-                    "type": "progress", 
-                    "value": progress, 
-                    "message": f"Processing {symbol} ({i+1}/{total})...",
-                    "current_symbol": symbol
-                }) + "\n"
-                
-                # Logic (Copied from app.py)
-                try:
-                    to_date_obj = datetime.strptime(row['date'], "%Y-%m-%dT%H:%M:%S.%fZ")
-                    to_date_str = to_date_obj.strftime("%Y-%m-%d %H:%M")
-                    # For Intraday (15min), we need fewer days but enough for EMA20 (~1-2 days).
-                    # Fetching 10 days is safe and fast.
-                    from_date_obj = to_date_obj - timedelta(days=10)
-                    from_date_str = from_date_obj.strftime("%Y-%m-%d %H:%M")
-                    
-                    # Fetch Data - Intraday 15min
-                    hist_df, error_msg = api_client.fetch_historical_data(symbol, from_date_str, to_date_str, interval='FIFTEEN_MINUTE')
-                    
-                    if hist_df is not None:
-                        hist_df = calculate_indicators(hist_df)
-                        result = validate_setup(row, hist_df)
-                        
-                        if result['valid']:
-                            res_row = result.copy()
-                            res_row['symbol'] = symbol
-                            res_row['date'] = target_date_str
-                            valid_trades.append(res_row)
-                            # Emit found match immediately!
-                            yield json.dumps({"type": "match_found", "data": res_row}) + "\n"
-                        else:
-                            rej_row = result.copy()
-                            rej_row['symbol'] = symbol
-                            rejected_trades.append(rej_row)
-                            rejected_trades.append(rej_row)
-                            # Emit rejected match
-                            yield json.dumps({"type": "match_rejected", "message": result['reason'], "current_symbol": symbol}) + "\n"
-                    else:
-                        msg = f"No Data ({error_msg})"
-                        rejected_trades.append({'symbol': symbol, 'reason': msg, 'valid': False})
-                        yield json.dumps({"type": "match_rejected", "message": msg, "current_symbol": symbol}) + "\n"
-                except Exception as e:
-                     rejected_trades.append({'symbol': symbol, 'reason': f"Error: {str(e)}", 'valid': False})
-
-                # Sleep needed for async generator to yield control? 
-                # Actually, blocking sleep stops the loop. But fetch_historical_data has sleep.
-                # In FastAPI Sync path, it blocks. We should probably make this async properly or use run_in_executor
-                # But for now, since it's a generator, the sleep inside fetch_historical_data will just pause this thread.
-                # To be safer with rate limits and responsiveness, we keep the sleep in the client.
-                await asyncio.sleep(0.01) 
-
-            # Final Result - Sort by Quality
-            # Priority 1: EMA Spread (Lower is better)
-            # Priority 2: Price Extension (Lower is better)
-            valid_trades.sort(key=lambda x: (x.get('spread_pct', 100), x.get('price_extension_pct', 100)))
-
-            yield json.dumps({
-                "type": "complete", 
-                "valid_count": len(valid_trades),
-                "rejected_count": len(rejected_trades),
-                "valid_trades": valid_trades
-            }) + "\n"
-
-        except Exception as e:
-            yield json.dumps({"type": "error", "message": f"Critical Error: {str(e)}"}) + "\n"
-
-    return StreamingResponse(event_generator(), media_type="application/x-ndjson")
+    job, reused = create_job(payload)
+    return stream_job(job, announce=True, reused=reused)
+
+@app.post("/jobs")
+async def start_job(payload: dict):
+    """Starts a backtest job (same payload as /run-backtest) without streaming it."""
+    job, reused = create_job(payload)
+    return dict(job.info(), reused=reused)
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return find_job(job_id).info()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, offset: int = 0):
+    """Attaches to a job's event stream from line `offset`, following it until it ends."""
+    return stream_job(find_job(job_id), max(offset, 0))
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    find_job(job_id)
+    return job_manager.cancel(job_id).info()
+
+@app.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    """Re-runs a failed, cancelled or interrupted job; symbols already done are not recomputed."""
+    find_job(job_id)
+    return job_manager.resume(job_id).info()
+
+@app.get("/scan")
+async def scan(refresh: bool = False):
+    """
+    Runs the setup rules on the latest cached bar of every NSE equity.
+    refresh=true first fetches the universe's missing bars (bounded by the SmartAPI
+    rate limit, so it takes minutes for the full list); the scan itself only
+    reads what changed since the previous one.
+    """
+    try:
+        api_client = await prepare_client()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"SmartAPI Login Failed: {str(e)}")
+    throughput = None
+    if refresh:
+        stats = FetchStats()
+        await scanner.refresh_async(api_client, stats)
+        throughput = stats.summary(api_client.rate_limiter)
+    result = await asyncio.to_thread(scanner.scan, api_client.token_map, api_client.candle_cache)
+    return dict(result, throughput=throughput)
+
+@app.get("/scan/latest")
+async def latest_scan():
+    """Result of the most recent scan (from /scan or the background loop)."""
+    if scanner.latest is None:
+        raise HTTPException(status_code=404, detail="No scan yet")
+    return scanner.latest
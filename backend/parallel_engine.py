@@ -0,0 +1,129 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from candle_cache import to_naive_ist
+from indicators import ACTIVE_INDICATORS, FIELDS, compute
+from backtest_engine import validate_batch
+
+# Shared block layout: one float64 row per field, plus bar times (int64 ns, stored bit-for-bit)
+TIME_ROW = len(FIELDS)
+ROWS = len(FIELDS) + 1
+
+
+def pack_frames(frames):
+    """
+    Packs per-symbol candle frames into one (ROWS x total bars) float64 array.
+    Returns (symbols, offsets, block): symbol i owns columns offsets[i]:offsets[i + 1].
+    """
+    symbols = [symbol for symbol, df in frames.items() if df is not None and not df.empty]
+    lengths = [len(frames[symbol]) for symbol in symbols]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    block = np.empty((ROWS, offsets[-1]), dtype=np.float64)
+    for i, symbol in enumerate(symbols):
+        df = frames[symbol]
+        cols = slice(offsets[i], offsets[i + 1])
+        for row, field in enumerate(FIELDS):
+            block[row, cols] = df[field].to_numpy(dtype=float)
+        block[TIME_ROW, cols].view(np.int64)[:] = to_naive_ist(df['date']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    return symbols, offsets, block
+
+
+def evaluate_block(symbols, offsets, block, signals_df, names=ACTIVE_INDICATORS):
+    """
+    Indicators and validate_batch for packed symbols, all at once: the bars are
+    right-aligned into (symbols x bars) arrays for the NumPy kernels, then unstacked
+    into one candle frame. Same results as calculate_indicators + validate_batch.
+    """
+    lengths = np.diff(offsets)
+    n_sym, width = len(symbols), int(lengths.max(initial=0))
+    start = np.repeat(offsets[:-1], lengths)
+    rows = np.repeat(np.arange(n_sym), lengths)
+    cols = width - np.repeat(lengths, lengths) + (np.arange(offsets[-1]) - start)
+
+    times = block[TIME_ROW].view(np.int64)
+    stacked = {}
+    for row, field in enumerate(FIELDS):
+        stacked[field] = np.full((n_sym, width), np.nan)
+        stacked[field][rows, cols] = block[row]
+    stacked['time'] = np.full((n_sym, width), np.iinfo(np.int64).min, dtype=np.int64)
+    stacked['time'][rows, cols] = times
+    stacked['session'] = np.full((n_sym, width), -1, dtype=np.int64)
+    stacked['session'][rows, cols] = times // 86_400_000_000_000
+
+    candles = pd.DataFrame({
+        'symbol': np.repeat(np.array(symbols, dtype=object), lengths),
+        'date': times.view('datetime64[ns]'),
+        'close': block[FIELDS.index('close')],
+    })
+    for column, values in compute(stacked, names).items():
+        candles[column] = values[rows, cols]
+    return validate_batch(signals_df, candles)
+
+
+def _evaluate_shard(shm_name, total_bars, offsets, symbols, signals_df):
+    """Worker: copies its own columns out of the shared block and evaluates them."""
+    shm = SharedMemory(name=shm_name)
+    try:
+        shared = np.ndarray((ROWS, total_bars), dtype=np.float64, buffer=shm.buf)
+        block = np.array(shared[:, offsets[0]:offsets[-1]])
+        del shared
+    finally:
+        shm.close()
+    return evaluate_block(symbols, offsets - offsets[0], block, signals_df)
+
+
+class ParallelEngine:
+    """
+    Process-pool execution of the engine. Symbols are sharded across `workers`
+    processes; the candle arrays go through one shared-memory block instead of being
+    pickled as DataFrames, and only the (small) signals and results cross the pipe.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            # spawn: the server process has threads, which fork would copy mid-flight
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def evaluate(self, frames, signals_df):
+        """validate_batch results for signals_df, given {symbol: candle frame}."""
+        symbols, offsets, block = pack_frames(frames)
+        if not symbols:
+            return validate_batch(signals_df, None)
+
+        shm = SharedMemory(create=True, size=max(block.nbytes, 1))
+        try:
+            np.ndarray(block.shape, dtype=block.dtype, buffer=shm.buf)[:] = block
+            futures = []
+            for shard in np.array_split(np.arange(len(symbols)), min(self.workers, len(symbols))):
+                shard_symbols = [symbols[i] for i in shard]
+                shard_signals = signals_df[signals_df['tradingsymbol'].isin(shard_symbols)]
+                if shard_signals.empty:
+                    continue
+                futures.append(self.pool.submit(
+                    _evaluate_shard, shm.name, block.shape[1], offsets[shard[0]:shard[-1] + 2],
+                    shard_symbols, shard_signals))
+            results = [future.result() for future in futures]
+        finally:
+            shm.close()
+            shm.unlink()
+
+        # Signals whose symbol had no candles
+        rest = signals_df[~signals_df['tradingsymbol'].isin(symbols)]
+        results.append(validate_batch(rest, None))
+        return pd.concat(results).reindex(signals_df.index)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,151 @@
+import time
+import random
+import asyncio
+import threading
+
+# SmartAPI historical candle limits (getCandleData): per second, per minute, per hour
+HISTORICAL_RATE_LIMITS = [(3, 1), (180, 60), (5000, 3600)]
+
+# Adaptive behaviour (AIMD): halve the rate when the broker pushes back,
+# creep back up on every success.
+MIN_RATE_SCALE = 0.1
+DECREASE_FACTOR = 0.5
+INCREASE_STEP = 0.05
+DECREASE_COOLDOWN = 1.0  # many in-flight symbols hitting one throttle only halve the rate once
+# Exponential backoff with full jitter
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+# Consecutive throttles across all symbols, with no success in between, before re-login
+RELOGIN_STREAK = 8
+
+
+class TokenBucket:
+    """
+    Token bucket allowing `count` requests per `period` seconds, with bursts up to `count`.
+    reserve() takes a token immediately and returns how long the caller must wait before
+    using it, so callers queue up fairly instead of polling.
+    """
+
+    def __init__(self, count, period):
+        self.base_rate = count / period
+        self.rate = self.base_rate
+        self.capacity = count
+        self.tokens = float(count)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_scale(self, scale):
+        with self._lock:
+            self.rate = self.base_rate * scale
+            # Drop any saved-up burst when slowing down
+            self.tokens = min(self.tokens, self.capacity * scale)
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Combines several token buckets (e.g. per-second and per-minute limits) and adapts
+    their rate to how the broker responds across all in-flight requests.
+    Thread-safe; usable from both the sync and the async fetch paths.
+    """
+
+    def __init__(self, limits=HISTORICAL_RATE_LIMITS):
+        self.buckets = [TokenBucket(count, period) for count, period in limits]
+        self.scale = 1.0
+        self.throttle_streak = 0
+        self._relogin_signalled = False
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        return max(bucket.reserve() for bucket in self.buckets)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _apply_scale(self, scale):
+        self.scale = scale
+        for bucket in self.buckets:
+            bucket.set_scale(scale)
+
+    def on_success(self):
+        with self._lock:
+            self.throttle_streak = 0
+            self._relogin_signalled = False
+            if self.scale < 1.0:
+                self._apply_scale(min(1.0, self.scale + INCREASE_STEP))
+
+    def on_throttled(self):
+        with self._lock:
+            self.throttle_streak += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= DECREASE_COOLDOWN:
+                self._last_decrease = now
+                self._apply_scale(max(MIN_RATE_SCALE, self.scale * DECREASE_FACTOR))
+
+    def needs_relogin(self):
+        """True once per throttle streak long enough to suspect a stale session."""
+        with self._lock:
+            if self.throttle_streak >= RELOGIN_STREAK and not self._relogin_signalled:
+                self._relogin_signalled = True
+                return True
+            return False
+
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter for the given (0-based) attempt."""
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class FetchStats:
+    """Per-run request counters, reported as throughput at the end of a backtest."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.symbols = 0
+        self.symbols_ok = 0
+        self.cached = 0
+        self.coalesced = 0
+        self.warehouse = 0
+        self._lock = threading.Lock()
+
+    def record(self, field, n=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def summary(self, rate_limiter=None):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        summary = {
+            'elapsed_s': round(elapsed, 2),
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'errors': self.errors,
+            'symbols': self.symbols,
+            'symbols_ok': self.symbols_ok,
+            'cached': self.cached,
+            'coalesced': self.coalesced,
+            'warehouse': self.warehouse,
+            'requests_per_s': round(self.requests / elapsed, 2),
+            'symbols_per_s': round(self.symbols / elapsed, 2),
+        }
+        if rate_limiter is not None:
+            summary['rate_scale'] = round(rate_limiter.scale, 2)
+        return summary
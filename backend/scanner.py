@@ -0,0 +1,285 @@
+import time
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from backtest_engine import EMA_SPANS, EXTENSION_MAX_PCT, MIN_BARS, SPREAD_MAX_PCT, history_start
+from candle_cache import DATE_FORMAT, IST, now_ist, close_arrays
+from indicators import ema
+from rate_limiter import HISTORICAL_RATE_LIMITS
+from smart_api_client import FETCH_CONCURRENCY
+from trading_calendar import CALENDAR, INTERVAL_MINUTES
+
+SCAN_INTERVAL = 'FIFTEEN_MINUTE'
+# Loop period of the optional background scanner (SCANNER_LOOP=1): one bar
+SCAN_EVERY = INTERVAL_MINUTES[SCAN_INTERVAL] * 60
+# Share of the hourly getCandleData limit the loop may use; the rest is left to backtests and /scan
+REFRESH_SHARE = 0.4
+# Symbols refreshed per loop cycle (one tail request each): 500 of the ~2,450 NSE equities
+REFRESH_PER_CYCLE = int(HISTORICAL_RATE_LIMITS[-1][0] * REFRESH_SHARE * SCAN_EVERY / HISTORICAL_RATE_LIMITS[-1][1])
+# The loop fetches one symbol at a time, so it never holds more than one slot of the shared limiter
+REFRESH_CONCURRENCY = 1
+# Seconds after a bar closes before the loop requests it
+BAR_SETTLE = 5
+NO_TIME = np.iinfo(np.int64).min
+
+
+def nse_equities(token_map):
+    """(symbol, token) for every NSE equity (-EQ) in the token map."""
+    return [(symbol, str(instrument.token)) for symbol, instrument in token_map.items()
+            if instrument.exch_seg == 'NSE' and instrument.symbol.endswith('-EQ')]
+
+
+def next_bar_close(now, interval):
+    """The first bar close of `interval` after now (naive IST), today or in a later session."""
+    closes = CALENDAR.grid(interval) + INTERVAL_MINUTES[interval]
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if CALENDAR.is_session(now.date()):
+        i = int(np.searchsorted(closes, (now - midnight) / timedelta(minutes=1), side='right'))
+        if i < len(closes):
+            return midnight + timedelta(minutes=int(closes[i]))
+    following = np.searchsorted(CALENDAR.sessions, np.datetime64(now.date(), 'D'), side='right')
+    return datetime.combine(CALENDAR.sessions[following].item(), midnight.time()) + timedelta(minutes=int(closes[0]))
+
+
+def _minute(ns):
+    """Bar time (int64 ns, naive IST) as a DATE_FORMAT string."""
+    return str(np.datetime64(int(ns), 'ns').astype('datetime64[m]')).replace('T', ' ')
+
+
+class UniverseScanner:
+    """
+    Runs the setup rules (EMA 9 > EMA 20, price above both, spread <= 1.5%,
+    extension <= 6%) on the latest bar of every NSE equity.
+
+    State is one array slot per symbol: last bar time and close, bar count and, per
+    EMA, its value at the last bar and just before it. New bars come from ingest()
+    (frames fetched by refresh_async) or, for candle-cache files changed since the
+    previous scan, from disk. A scan advances the EMAs of the updated symbols over
+    their new bars in one vectorized pass (the last bar is recomputed, since a live
+    bar may have moved); the rules are then array comparisons over the whole
+    universe. Stage 2 comes from brkpoint signals and is not checked here.
+    """
+
+    def __init__(self, interval=SCAN_INTERVAL):
+        self.interval = interval
+        self.symbols = []
+        self.tokens = []
+        self._rows = {}         # token -> slot
+        self._inbox = {}        # token -> (frame, file mtime) handed over by ingest(), not yet applied
+        self._source = None
+        self.latest = None
+        self._lock = threading.Lock()           # held for a whole scan, off the event loop
+        self._inbox_lock = threading.Lock()     # only guards _inbox, so ingest() never waits for a scan
+        self._allocate(0)
+
+    def _allocate(self, n):
+        self.last_time = np.full(n, NO_TIME, dtype=np.int64)
+        self.close = np.full(n, np.nan)
+        self.bars = np.zeros(n, dtype=np.int64)
+        self.mtime = np.full(n, np.nan)
+        self.ema = {name: np.full(n, np.nan) for name in EMA_SPANS}
+        self.seed = {name: np.full(n, np.nan) for name in EMA_SPANS}
+
+    def set_universe(self, token_map):
+        """(Re)builds the symbol list when the token map changes; known symbols keep their state."""
+        if token_map is self._source:
+            return
+        old = {symbol: i for i, symbol in enumerate(self.symbols)}
+        state = (self.last_time, self.close, self.bars, self.mtime, self.ema, self.seed)
+        universe = nse_equities(token_map)
+        self.symbols = [symbol for symbol, _ in universe]
+        self.tokens = [token for _, token in universe]
+        self._rows = {token: i for i, token in enumerate(self.tokens)}
+        self._allocate(len(universe))
+        keep = [(i, old[symbol]) for i, symbol in enumerate(self.symbols) if symbol in old]
+        if keep:
+            new_rows, old_rows = map(list, zip(*keep))
+            last_time, close, bars, mtime, ema, seed = state
+            self.last_time[new_rows] = last_time[old_rows]
+            self.close[new_rows] = close[old_rows]
+            self.bars[new_rows] = bars[old_rows]
+            self.mtime[new_rows] = mtime[old_rows]
+            for name in EMA_SPANS:
+                self.ema[name][new_rows] = ema[name][old_rows]
+                self.seed[name][new_rows] = seed[name][old_rows]
+        self._source = token_map
+
+    def _since(self, row):
+        """Bars are (re)read from the last bar seen, which may have changed, or from the warm-up start."""
+        last = self.last_time[row]
+        if last != NO_TIME:
+            return last
+        return np.datetime64(history_start(now_ist(), self.interval), 'ns').astype(np.int64)
+
+    def ingest(self, token, df, modified=None):
+        """
+        Hands over a freshly fetched frame, so the next scan does not read it back from
+        disk. Safe to call from the event loop: it only queues the frame.
+        """
+        if df is None or df.empty:
+            return
+        with self._inbox_lock:
+            self._inbox[token] = (df, modified)
+
+    def load(self, cache):
+        """Applies ingested frames and the new bars of changed cache files to the EMA state. Returns slots updated."""
+        with self._inbox_lock:
+            inbox, self._inbox = self._inbox, {}
+        tails = {}
+        for token, (df, modified) in inbox.items():
+            row = self._rows.get(token)
+            if row is None:
+                continue
+            tails[row] = close_arrays(df, self._since(row))
+            if modified is not None:
+                self.mtime[row] = modified
+        for row, token in enumerate(self.tokens):
+            modified = cache.modified(token, self.interval)
+            if modified is None or modified == self.mtime[row]:
+                continue
+            self.mtime[row] = modified
+            bars = cache.closes(token, self.interval, self._since(row))
+            if bars is not None:
+                tails[row] = bars
+        tails = [(row, times, closes) for row, (times, closes) in tails.items() if len(times)]
+        if tails:
+            self._advance(tails)
+        return len(tails)
+
+    def _advance(self, tails):
+        rows = np.array([row for row, _, _ in tails])
+        counts = np.array([len(closes) for _, _, closes in tails])
+        closes = np.full((len(tails), counts.max()), np.nan)
+        for i, (_, _, values) in enumerate(tails):
+            closes[i, :len(values)] = values
+        last = np.arange(len(tails)), counts - 1
+
+        # A known symbol's tail starts at its last bar again: continue from the EMA before it
+        known = self.last_time[rows] != NO_TIME
+        for name, span in EMA_SPANS.items():
+            # Tails are right-padded with NaN; the values read back all come before the padding
+            out = ema(closes, span, np.where(known, self.seed[name][rows], np.nan))
+            self.seed[name][rows] = np.where(counts >= 2, out[last[0], np.maximum(counts - 2, 0)],
+                                             self.seed[name][rows])
+            self.ema[name][rows] = out[last]
+
+        self.bars[rows] = np.where(known, self.bars[rows] - 1, 0) + counts
+        self.close[rows] = closes[last]
+        self.last_time[rows] = [times[-1] for _, times, _ in tails]
+
+    def evaluate(self):
+        """Applies the setup rules to every symbol's latest bar. Returns the scan result dict."""
+        ema_9, ema_20, close = self.ema['EMA_9'], self.ema['EMA_20'], self.close
+        has_data = self.last_time != NO_TIME
+        as_of = self.last_time.max(initial=NO_TIME)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            spread_pct = np.abs(ema_9 - ema_20) / ema_20 * 100
+            price_extension_pct = (close - ema_20) / ema_20 * 100
+        # Symbols whose last bar is from an earlier session than the newest bar in the universe
+        bar_sessions = CALENDAR.positions(self.last_time.view('datetime64[ns]'))
+        outdated = bar_sessions < bar_sessions[has_data].max(initial=-1)
+
+        conditions = [
+            self.bars < MIN_BARS,
+            outdated,
+            ~(ema_9 > ema_20),
+            ~((close > ema_9) & (close > ema_20)),
+            spread_pct > SPREAD_MAX_PCT,
+            price_extension_pct > EXTENSION_MAX_PCT,
+        ]
+        reasons = ['Insufficient Data', 'Data Outdated', 'EMA 9 < EMA 20', 'Price below EMAs',
+                   'Overextended', 'Price Extended']
+        reason = np.select(conditions, reasons, default='Valid Setup')
+        valid = ~np.logical_or.reduce(conditions)
+
+        matches = [{
+            'symbol': self.symbols[i],
+            'close': float(close[i]),
+            'ema_9': float(ema_9[i]),
+            'ema_20': float(ema_20[i]),
+            'spread_pct': float(spread_pct[i]),
+            'price_extension_pct': float(price_extension_pct[i]),
+        } for i in np.flatnonzero(valid)]
+        matches.sort(key=lambda x: (x['spread_pct'], x['price_extension_pct']))
+        names, counts = np.unique(reason, return_counts=True)
+        return {
+            'as_of': _minute(as_of) if as_of != NO_TIME else None,
+            'scanned': len(self.symbols),
+            'with_data': int(has_data.sum()),
+            'valid_count': len(matches),
+            'reasons': {str(name): int(count) for name, count in zip(names, counts)},
+            'matches': matches,
+        }
+
+    def scan(self, token_map, cache):
+        """One scan over cached candles: refresh state from changed files, then apply the rules."""
+        with self._lock:
+            started = time.perf_counter()
+            self.set_universe(token_map)
+            updated = self.load(cache)
+            result = self.evaluate()
+            result['updated'] = updated
+            result['elapsed_s'] = round(time.perf_counter() - started, 3)
+            self.latest = result
+            return result
+
+    def stale(self, cache, universe, fresh_since):
+        """(symbol, token) pairs whose cache file was not written since fresh_since (naive IST), stalest first."""
+        cutoff = fresh_since.replace(tzinfo=IST).timestamp()
+        modified = [(cache.modified(token, self.interval), symbol, token) for symbol, token in universe]
+        return [(symbol, token) for mtime, symbol, token in sorted(modified, key=lambda m: m[0] or 0.0)
+                if mtime is None or mtime < cutoff]
+
+    async def refresh_async(self, api_client, stats=None, limit=None, fresh_since=None,
+                            concurrency=FETCH_CONCURRENCY):
+        """
+        Fetches the universe's candles into the cache (rate-limited; only missing bars
+        are requested) and hands each frame to ingest(). With fresh_since, symbols whose
+        cache was written after it are skipped; limit caps the symbols fetched, stalest
+        first. Returns symbols fetched.
+        """
+        now = now_ist()
+        from_date = history_start(now, self.interval).strftime(DATE_FORMAT)
+        to_date = now.strftime(DATE_FORMAT)
+        universe = nse_equities(api_client.token_map)
+        tokens = dict(universe)
+        if fresh_since is not None:
+            universe = await asyncio.to_thread(self.stale, api_client.candle_cache, universe, fresh_since)
+        if limit is not None:
+            universe = universe[:limit]
+        jobs = [(symbol, symbol, from_date, to_date, self.interval) for symbol, _ in universe]
+        fetched = 0
+        async for symbol, df, _ in api_client.fetch_many_async(jobs, concurrency=concurrency, stats=stats):
+            token = tokens[symbol]
+            self.ingest(token, df, api_client.candle_cache.modified(token, self.interval))
+            fetched += df is not None
+        return fetched
+
+    async def run_loop(self, prepare_client):
+        """
+        Refresh + scan after every bar close (wall clock) while the market is open.
+
+        Refreshing the whole universe every bar cannot be kept up: one request per
+        symbol for ~2,450 NSE equities every 15 minutes is ~9,800 requests/hour against
+        the 5,000/hour getCandleData limit. Each cycle instead refreshes at most
+        REFRESH_PER_CYCLE symbols whose cache is older than the bar close, stalest
+        first, one request at a time, so backtests sharing the client's rate limiter
+        keep most of it. A full pass over the universe takes about five bars; the scan
+        itself always covers every symbol with what is cached.
+        """
+        while True:
+            bar_close = next_bar_close(now_ist(), self.interval)
+            await asyncio.sleep(max(0.0, (bar_close - now_ist()).total_seconds()) + BAR_SETTLE)
+            try:
+                api_client = await prepare_client()
+                fetched = await self.refresh_async(api_client, limit=REFRESH_PER_CYCLE, fresh_since=bar_close,
+                                                   concurrency=REFRESH_CONCURRENCY)
+                result = await asyncio.to_thread(self.scan, api_client.token_map, api_client.candle_cache)
+                print(f"Scan after the {bar_close:%H:%M} close: {result['valid_count']} setups in "
+                      f"{result['scanned']} symbols, {fetched} refreshed ({result['elapsed_s']}s)")
+            except Exception as e:
+                print(f"Scanner loop error: {e}")
@@ -0,0 +1,350 @@
+import os
+import json
+import mmap
+import sys
+import time
+import struct
+import tracemalloc
+from bisect import bisect_left
+from collections.abc import Mapping
+
+from http_pool import session
+
+# On-disk index layout:
+#   header  : magic, version, record count, record size
+#   records : fixed-width, sorted by lookup key so lookups are a binary search
+INDEX_MAGIC = b"SWSM"
+INDEX_VERSION = 2
+HEADER = struct.Struct("<4sHIH")
+KEY_SIZE = 24
+RECORD = struct.Struct(f"<{KEY_SIZE}s{KEY_SIZE}sqd8s")  # key, symbol, token, tick_size, exch_seg
+
+
+class Instrument:
+    """Compact, typed scrip master record. Replaces the raw all-string JSON dict."""
+    __slots__ = ('token', 'symbol', 'exch_seg', 'tick_size')
+
+    def __init__(self, token, symbol, exch_seg, tick_size):
+        self.token = token
+        self.symbol = symbol
+        self.exch_seg = exch_seg
+        self.tick_size = tick_size
+
+    @classmethod
+    def from_item(cls, item):
+        return cls(
+            int(item['token']),
+            item['symbol'],
+            sys.intern(item['exch_seg']),
+            float(item['tick_size'] or 0),
+        )
+
+    def __repr__(self):
+        return f"Instrument({self.symbol!r}, token={self.token}, exch_seg={self.exch_seg!r})"
+
+STREAM_CHUNK_SIZE = 1 << 20
+
+
+def iter_scrip_master(json_path, exch_seg=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Streams instruments out of the scrip master JSON array one at a time.
+    Only a chunk of raw text plus the current item is held in memory; when
+    exch_seg is given, non-matching items are dropped as soon as they are decoded.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_path, 'r') as f:
+        buf = f.read(chunk_size).lstrip()
+        if not buf.startswith('['):
+            raise ValueError(f"Scrip master is not a JSON array: {json_path}")
+        pos = 1
+        eof = False
+        while True:
+            # Skip separators between items
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Item straddles the chunk boundary: keep the tail, read more.
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            pos = end
+            if exch_seg is None or item.get('exch_seg') == exch_seg:
+                yield item
+
+
+def build_token_map(items):
+    """
+    Builds the Symbol -> instrument mapping from scrip master items.
+    NSE equities are keyed by their root symbol (RELIANCE-EQ -> RELIANCE),
+    other NSE instruments by their full symbol.
+    """
+    token_map = {}
+    for item in items:
+        if item['exch_seg'] == 'NSE' and item['symbol'].endswith('-EQ'):
+            symbol_root = item['symbol'].replace('-EQ', '')
+            token_map[symbol_root] = item
+        elif item['exch_seg'] == 'NSE':
+            token_map[item['symbol']] = item
+    return token_map
+
+
+def build_scrip_index(json_path, index_path):
+    """
+    Compiles the scrip master JSON into the fixed-width binary index.
+    Written to a temp file and swapped in so readers never see a partial index.
+    Returns the number of records written.
+    """
+    token_map = build_token_map(iter_scrip_master(json_path, exch_seg='NSE'))
+
+    keys = sorted(k for k in token_map if len(k.encode()) <= KEY_SIZE)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(keys), RECORD.size))
+        for key in keys:
+            inst = Instrument.from_item(token_map[key])
+            f.write(RECORD.pack(key.encode(), inst.symbol.encode(), inst.token, inst.tick_size, inst.exch_seg.encode()))
+    os.replace(tmp_path, index_path)
+    return len(keys)
+
+
+def is_index_fresh(json_path, index_path):
+    """True if the index exists, has the current layout and is newer than the JSON."""
+    if not os.path.exists(index_path):
+        return False
+    if os.path.exists(json_path) and os.path.getmtime(index_path) < os.path.getmtime(json_path):
+        return False
+    try:
+        with open(index_path, 'rb') as f:
+            magic, version, _, record_size = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return False
+    return magic == INDEX_MAGIC and version == INDEX_VERSION and record_size == RECORD.size
+
+
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+DOWNLOAD_TIMEOUT = (10, 60)  # connect, read
+
+
+def _meta_path(json_path):
+    return json_path + ".meta"
+
+
+def _read_meta(json_path):
+    try:
+        with open(_meta_path(json_path), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(json_path, meta):
+    tmp_path = _meta_path(json_path) + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, _meta_path(json_path))
+
+
+def scrip_master_age(json_path):
+    """Seconds since the scrip master was last downloaded or confirmed unchanged."""
+    checked_at = _read_meta(json_path).get('checked_at')
+    if checked_at is None:
+        checked_at = os.path.getmtime(json_path)
+    return time.time() - checked_at
+
+
+def _discard_partial(json_path, meta, part_path):
+    """Removes an interrupted download and its validators, so the next download starts from scratch."""
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    meta['partial'] = None
+    _write_meta(json_path, meta)
+
+
+def download_scrip_master(url, json_path):
+    """
+    Conditional, resumable download of the scrip master.
+
+    Sends If-None-Match / If-Modified-Since from the last download, streams the
+    body in chunks to a .part file and swaps it in atomically. An interrupted
+    transfer leaves the .part file behind and the next call resumes it with a
+    Range request (only for uncompressed bodies, where byte offsets are stable).
+
+    Returns True if a new file was written, False if the server reported it
+    unchanged, None on failure.
+    """
+    meta = _read_meta(json_path)
+    part_path = json_path + ".part"
+    headers = {}
+    if os.path.exists(json_path):
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    partial = meta.get('partial') or {}
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = partial.get('etag') or partial.get('last_modified')
+    if offset and validator:
+        headers['Range'] = f"bytes={offset}-"
+        headers['If-Range'] = validator
+
+    try:
+        with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+            if r.status_code == 304:
+                meta['checked_at'] = time.time()
+                _write_meta(json_path, meta)
+                print("Scrip master unchanged (304), keeping local copy.")
+                return False
+            if r.status_code not in (200, 206):
+                print(f"Failed to download Scrip Master: {r.status_code}")
+                if 'Range' in headers:
+                    # The partial file cannot be resumed (416: it is not a prefix of the
+                    # current file); start over on the next call
+                    _discard_partial(json_path, meta, part_path)
+                return None
+
+            resumable = r.headers.get('Content-Encoding', 'identity') == 'identity'
+            validators = {
+                'etag': r.headers.get('ETag'),
+                'last_modified': r.headers.get('Last-Modified'),
+            }
+            meta['partial'] = validators if resumable else None
+            _write_meta(json_path, meta)
+
+            mode = 'ab' if r.status_code == 206 else 'wb'
+            if mode == 'ab':
+                print(f"Resuming Scrip Master download at {offset} bytes...")
+            try:
+                with open(part_path, mode) as f:
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+            except Exception:
+                if not resumable and os.path.exists(part_path):
+                    os.remove(part_path)
+                raise
+    except Exception as e:
+        print(f"Failed to download Scrip Master: {e}")
+        return None
+
+    os.replace(part_path, json_path)
+    meta.update(validators)
+    meta['partial'] = None
+    meta['checked_at'] = time.time()
+    _write_meta(json_path, meta)
+    return True
+
+
+class _IndexKeys:
+    """Sequence view over the sorted record keys, for bisect."""
+
+    def __init__(self, index):
+        self._index = index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, i):
+        return self._index._key_at(i)
+
+
+class ScripIndex(Mapping):
+    """
+    Read-only, memory-mapped Symbol -> Instrument mapping.
+    Nothing is parsed up front; each lookup is a binary search over the mapped records.
+    """
+
+    def __init__(self, index_path):
+        with open(index_path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, record_size = HEADER.unpack_from(self._mm, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or record_size != RECORD.size:
+            self._mm.close()
+            raise ValueError(f"Unsupported scrip index: {index_path}")
+        self._count = count
+        self._keys = _IndexKeys(self)
+
+    def _record(self, i):
+        return RECORD.unpack_from(self._mm, HEADER.size + i * RECORD.size)
+
+    def _key_at(self, i):
+        return self._record(i)[0].rstrip(b"\0").decode()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._key_at(i)
+
+    def __getitem__(self, symbol):
+        i = bisect_left(self._keys, symbol)
+        if i < self._count:
+            key, raw_symbol, token, tick_size, exch_seg = self._record(i)
+            if key.rstrip(b"\0").decode() == symbol:
+                return Instrument(
+                    token,
+                    raw_symbol.rstrip(b"\0").decode(),
+                    sys.intern(exch_seg.rstrip(b"\0").decode()),
+                    tick_size,
+                )
+        raise KeyError(symbol)
+
+    def close(self):
+        self._mm.close()
+
+
+def _rss_mb():
+    """Current resident set size in MB (Linux /proc, falls back to peak RSS elsewhere)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def memory_report(json_path, index_path):
+    """
+    Measures what the NSE token table costs in memory for each representation:
+    raw JSON dicts (the old token_map), Instrument records, and the mmap index.
+    Returns {name: (rss_delta_mb, traced_mb)}.
+    """
+    report = {}
+
+    def measure(name, build):
+        tracemalloc.start()
+        rss_before = _rss_mb()
+        table = build()
+        rss_after = _rss_mb()
+        traced, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report[name] = (rss_after - rss_before, traced / 1e6)
+        return table
+
+    def compact_map():
+        token_map = build_token_map(iter_scrip_master(json_path, exch_seg='NSE'))
+        return {k: Instrument.from_item(v) for k, v in token_map.items()}
+
+    raw = measure('raw dicts', lambda: build_token_map(iter_scrip_master(json_path, exch_seg='NSE')))
+    del raw
+    compact = measure('Instrument records', compact_map)
+    del compact
+    if not is_index_fresh(json_path, index_path):
+        build_scrip_index(json_path, index_path)
+    measure('mmap index', lambda: ScripIndex(index_path))
+    return report
+
+
+if __name__ == "__main__":
+    json_file = sys.argv[1] if len(sys.argv) > 1 else "OpenAPIScripMaster.json"
+    index_file = os.path.splitext(json_file)[0] + ".idx"
+    for name, (rss, traced) in memory_report(json_file, index_file).items():
+        print(f"{name:<20} RSS +{rss:7.2f} MB   allocated {traced:7.2f} MB")
@@ -1,11 +1,23 @@
 import os
 import json
 import time
-import requests
+import asyncio
+import threading
 import pandas as pd
 from SmartApi import SmartConnect
+import SmartApi.smartConnect as smart_connect
+import SmartApi.smartExceptions as smart_exceptions
+from urllib.parse import urljoin
 import pyotp
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from candle_cache import DATE_FORMAT, MINUTE, CandleCache
+from candle_warehouse import CandleWarehouse
+from http_pool import session as http_session
+from rate_limiter import FetchStats, RateLimiter
+from scrip_master import (
+    ScripIndex, build_scrip_index, download_scrip_master, is_index_fresh, scrip_master_age,
+)
 
 # Credentials
 CLIENT_ID = "AAAG399109"
@@ -16,6 +28,85 @@ HISTORICAL_API_KEY = "c3C0tMGn"
 # Scrip Master URL
 SCRIP_MASTER_URL = "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json"
 SCRIP_MASTER_FILE = "OpenAPIScripMaster.json"
+SCRIP_INDEX_FILE = "OpenAPIScripMaster.idx"
+# Minimum gap between background refreshes triggered by invalid-token errors
+SCRIP_REFRESH_COOLDOWN = 300
+# Symbols fetched at once by fetch_many_async; the rate limiter caps actual request rate
+FETCH_CONCURRENCY = 4
+# Longest window getCandleData serves in one call, in days, per interval
+MAX_DAYS_PER_REQUEST = {
+    'ONE_MINUTE': 30, 'THREE_MINUTE': 60, 'FIVE_MINUTE': 100, 'TEN_MINUTE': 100,
+    'FIFTEEN_MINUTE': 200, 'THIRTY_MINUTE': 200, 'ONE_HOUR': 400, 'ONE_DAY': 2000,
+}
+
+def request_ranges(ranges, interval):
+    """Splits (from, to) ranges (inclusive, DATE_FORMAT) into pieces of at most one request each."""
+    span = timedelta(days=MAX_DAYS_PER_REQUEST.get(interval, 30))
+    pieces = []
+    for range_from, range_to in ranges:
+        start = datetime.strptime(range_from, DATE_FORMAT)
+        end = datetime.strptime(range_to, DATE_FORMAT)
+        while start <= end:
+            piece_end = min(start + span - MINUTE, end)
+            pieces.append((start.strftime(DATE_FORMAT), piece_end.strftime(DATE_FORMAT)))
+            start = piece_end + MINUTE
+    return pieces
+
+class PooledSmartConnect(SmartConnect):
+    """
+    SmartConnect whose API calls go through the shared pooled session (http_pool),
+    so logins and candle requests reuse keep-alive connections. SmartConnect's own
+    _request opens a new connection for every call via requests.request and ignores
+    its reqsession, so the method is overridden; it logs like the library does
+    (failed requests and status: False replies go to logs/<date>/app.log).
+    """
+
+    def _request(self, route, method, parameters=None):
+        params = parameters.copy() if parameters else {}
+        url = urljoin(self.root, self._routes[route].format(**params))
+        headers = self.requestHeaders()
+        if self.access_token:
+            headers["Authorization"] = "Bearer {}".format(self.access_token)
+
+        if self.debug:
+            smart_connect.log.debug(f"Request: {method} {url} {params} {headers}")
+        try:
+            r = http_session.request(method,
+                                     url,
+                                     data=json.dumps(params) if method in ["POST", "PUT"] else None,
+                                     params=json.dumps(params) if method in ["GET", "DELETE"] else None,
+                                     headers=headers,
+                                     verify=not self.disable_ssl,
+                                     allow_redirects=True,
+                                     timeout=self.timeout,
+                                     proxies=self.proxies)
+        except Exception as e:
+            smart_connect.logger.error(f"Error occurred while making a {method} request to {url}. "
+                                       f"Headers: {headers}, Request: {params}, Response: {e}")
+            raise
+        if self.debug:
+            smart_connect.log.debug(f"Response: {r.status_code} {r.content}")
+
+        if "json" in headers["Content-type"]:
+            try:
+                data = json.loads(r.content.decode("utf8"))
+            except ValueError:
+                raise smart_exceptions.DataException(
+                    "Couldn't parse the JSON response received from the server: {}".format(r.content))
+            if data.get("error_type"):
+                if self.session_expiry_hook and r.status_code == 403 and data["error_type"] == "TokenException":
+                    self.session_expiry_hook()
+                exp = getattr(smart_exceptions, data["error_type"], smart_exceptions.GeneralException)
+                raise exp(data["message"], code=r.status_code)
+            if data.get("status", False) is False:
+                smart_connect.logger.error(f"Error occurred while making a {method} request to {url}. "
+                                           f"Error: {data['message']}. URL: {url}, Headers: {self.requestHeaders()}, "
+                                           f"Request: {params}, Response: {data}")
+            return data
+        elif "csv" in headers["Content-type"]:
+            return r.content
+        raise smart_exceptions.DataException(
+            "Unknown Content-type ({}) with response: ({})".format(headers["Content-type"], r.content))
 
 class SmartApiClient:
     def __init__(self):
@@ -23,8 +114,18 @@ class SmartApiClient:
         self.client_id = CLIENT_ID
         self.password = PASSWORD
         self.totp_secret = TOTP_SECRET
-        self.smartApi = SmartConnect(api_key=self.api_key)
+        self.smartApi = PooledSmartConnect(api_key=self.api_key)
         self.token_map = None
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+        self._last_refresh = 0
+        # Shared by every in-flight fetch so all symbols together stay under SmartAPI limits
+        self.rate_limiter = RateLimiter()
+        self.candle_cache = CandleCache()
+        # Durable columnar history read by backtest_engine.load_candles (needs pyarrow)
+        self.warehouse = CandleWarehouse()
+        # (symbol, interval, from, to) -> in-flight fetch task, for request coalescing
+        self._inflight = {}
         
     def login(self):
         try:
@@ -46,38 +147,64 @@ class SmartApiClient:
         """Downloads or loads the scrip master JSON to map symbols to tokens."""
         if os.path.exists(SCRIP_MASTER_FILE):
              # Check if file is older than 24 hours, if so, refresh
-             file_time = os.path.getmtime(SCRIP_MASTER_FILE)
-             if (time.time() - file_time) > 86400:
-                 print("Scrip master old, downloading...")
-                 self._download_scrip_master()
+             if scrip_master_age(SCRIP_MASTER_FILE) > 86400:
+                 print("Scrip master old, checking for a new one...")
+                 changed = self._download_scrip_master()
+                 if not changed and self.token_map is not None:
+                     # Nothing new on the server: keep the map we already have.
+                     return
         else:
             print("Scrip master not found, downloading...")
             self._download_scrip_master()
 
-        # Load into memory
+        # Compile the binary index once per download, then memory-map it.
+        # Lookups read straight from the mapped file, so the 30+ MB JSON is never parsed here.
+        if not is_index_fresh(SCRIP_MASTER_FILE, SCRIP_INDEX_FILE):
+            print("Building Scrip Master index...")
+            build_scrip_index(SCRIP_MASTER_FILE, SCRIP_INDEX_FILE)
+
         print("Loading Scrip Master...")
-        with open(SCRIP_MASTER_FILE, 'r') as f:
-            data = json.load(f)
-            # Create a dictionary for fast lookup: Symbol -> {Token, Exchange}
-            # Assuming we prioritize NSE.
-            self.token_map = {}
-            for item in data:
-                if item['exch_seg'] == 'NSE' and item['symbol'].endswith('-EQ'):
-                     symbol_root = item['symbol'].replace('-EQ', '')
-                     self.token_map[symbol_root] = item
-                elif item['exch_seg'] == 'NSE':
-                     # Fallback or specific handling if needed
-                     self.token_map[item['symbol']] = item
+        self.token_map = ScripIndex(SCRIP_INDEX_FILE)
         print(f"Loaded {len(self.token_map)} NSE symbols.")
 
     def _download_scrip_master(self):
-        r = requests.get(SCRIP_MASTER_URL)
-        if r.status_code == 200:
-            with open(SCRIP_MASTER_FILE, 'w') as f:
-                f.write(r.text)
-        else:
-            print(f"Failed to download Scrip Master: {r.status_code}")
+        """Returns True if a new scrip master was downloaded (and indexed)."""
+        changed = download_scrip_master(SCRIP_MASTER_URL, SCRIP_MASTER_FILE)
+        if changed:
+            build_scrip_index(SCRIP_MASTER_FILE, SCRIP_INDEX_FILE)
+        return bool(changed)
 
+    def refresh_scrip_master_async(self):
+        """
+        Schedules a scrip master refresh on a background thread and returns immediately.
+        Concurrent callers are deduplicated: while a refresh is running, or within
+        SCRIP_REFRESH_COOLDOWN of the last one, further requests are ignored.
+        Returns True if a new refresh was started.
+        """
+        with self._refresh_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return False
+            if time.time() - self._last_refresh < SCRIP_REFRESH_COOLDOWN:
+                return False
+            self._last_refresh = time.time()
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_scrip_master, name="scrip-master-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+            return True
+
+    def _refresh_scrip_master(self):
+        try:
+            if not self._download_scrip_master() and self.token_map is not None:
+                print("Scrip master refresh: no changes.")
+                return
+            if not is_index_fresh(SCRIP_MASTER_FILE, SCRIP_INDEX_FILE):
+                build_scrip_index(SCRIP_MASTER_FILE, SCRIP_INDEX_FILE)
+            # Single reference assignment: readers see either the old map or the new one.
+            self.token_map = ScripIndex(SCRIP_INDEX_FILE)
+            print(f"Scrip master refreshed in background: {len(self.token_map)} NSE symbols.")
+        except Exception as e:
+            print(f"Background scrip master refresh failed: {e}")
 
     def get_token(self, symbol):
         if self.token_map is None:
@@ -85,23 +212,18 @@ class SmartApiClient:
         
         # 1. Direct match (e.g. from keys I stored)
         if symbol in self.token_map:
-            return self.token_map[symbol]['token']
+            return str(self.token_map[symbol].token)
         
         # 2. Key might be upper/lower case mismatch?
         # My keys are from cleaned symbols in UPPER.
         
         return None
 
-    def fetch_historical_data(self, symbol, from_date, to_date, interval='ONE_DAY'):
-        """
-        Fetches historical data.
-        Returns (df, error_message)
-        """
+    def _candle_params(self, symbol, from_date, to_date, interval):
         token = self.get_token(symbol)
         if not token:
-            return None, f"Token Not Found for {symbol}"
-
-        params = {
+            return None
+        return {
             "exchange": "NSE",
             "symboltoken": token,
             "interval": interval,
@@ -109,60 +231,203 @@ class SmartApiClient:
             "todate": to_date
         }
 
+    def _interpret_candle_response(self, symbol, response, attempt):
+        """
+        Interprets one getCandleData response.
+        Returns (df, error_message, retry_after, relogin); retry_after is None
+        when the outcome is final, otherwise the caller waits and tries again.
+        """
+        # Verify response is valid
+        if response is None:
+            # Treat None as error
+            return None, "API returned None", None, False
+
+        # Safe access 'status'
+        status = response.get('status', False)
+
+        # An empty list is a valid answer (e.g. a tail window with no sessions yet)
+        if status == True and isinstance(response.get('data'), list):
+            self.rate_limiter.on_success()
+            df = pd.DataFrame(response['data'], columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+            df['date'] = pd.to_datetime(df['date'])
+            df['open'] = df['open'].astype(float)
+            df['high'] = df['high'].astype(float)
+            df['low'] = df['low'].astype(float)
+            df['close'] = df['close'].astype(float)
+            df['volume'] = df['volume'].astype(int)
+            return df, None, None, False
+
+        msg = response.get('message', 'Unknown API Error')
+        error_code = response.get('errorcode', '')
+        # If Rate Limit or Server Error (AB1004), Retry
+        if error_code in ['AB1004', 'AB1005', 'AB2001']:
+             # Slow every in-flight fetch down, then back off this one with jitter.
+             self.rate_limiter.on_throttled()
+             delay = self.rate_limiter.backoff(attempt)
+             print(f"[{symbol}] Rate limit hit ({error_code}), attempt {attempt+1}/5. Backing off {delay:.1f}s...")
+             return None, None, delay, self.rate_limiter.needs_relogin()
+
+        # Self-Healing: If Invalid Token, refresh the Scrip Master in the background.
+        # The refresh never runs on the request path; this symbol fails for this run
+        # and later lookups pick up the new map once it has been swapped in.
+        if "Invalid Token" in msg or error_code == "AG8001": # Common invalid token code
+             if self.refresh_scrip_master_async():
+                 print(f"[{symbol}] Invalid Token detected. Scrip Master refresh scheduled.")
+             return None, f"Invalid Token for {symbol} (Scrip Master refresh scheduled)", None, False
+
+        return None, f"API Error: {msg} ({error_code})", None, False
+
+    def _fetch_range(self, symbol, params, stats):
+        """Fetches one date range from SmartAPI with rate limiting and retries."""
         for attempt in range(5):
             try:
+                self.rate_limiter.acquire()
+                stats.record('requests')
                 response = self.smartApi.getCandleData(params)
-                
-                # Verify response is valid
-                if response is None:
-                    # Treat None as error
-                    return None, "API returned None"
-
-                # Safe access 'status'
-                status = response.get('status', False)
-                
-                if status == True and response.get('data'):
-                    df = pd.DataFrame(response['data'], columns=['date', 'open', 'high', 'low', 'close', 'volume'])
-                    df['date'] = pd.to_datetime(df['date'])
-                    df['open'] = df['open'].astype(float)
-                    df['high'] = df['high'].astype(float)
-                    df['low'] = df['low'].astype(float)
-                    df['close'] = df['close'].astype(float)
-                    df['volume'] = df['volume'].astype(int)
-                    return df, None
-                else:
-                    msg = response.get('message', 'Unknown API Error')
-                    error_code = response.get('errorcode', '')
-                    # If Rate Limit or Server Error (AB1004), Retry
-                    if error_code in ['AB1004', 'AB1005', 'AB2001']:
-                         print(f"[{symbol}] Rate limit hit ({error_code}), attempt {attempt+1}/5. Sleeping 5s...")
-                         time.sleep(5) 
-                         if attempt == 2:
-                             self.login()
-                         continue
-                    
-                    # Self-Healing: If Invalid Token, Refresh Scrip Master
-                    if "Invalid Token" in msg or error_code == "AG8001": # Common invalid token code
-                         print(f"[{symbol}] Invalid Token detected. Refreshing Scrip Master...")
-                         self._download_scrip_master()
-                         self.load_scrip_master()
-                         # Should we update the token variable?
-                         token = self.get_token(symbol)
-                         params["symboltoken"] = token
-                         time.sleep(2)
-                         continue
-
-                    return None, f"API Error: {msg} ({error_code})"
+                df, error, retry_after, relogin = self._interpret_candle_response(symbol, response, attempt)
             except Exception as e:
                 print(f"Exception for {symbol}: {e}")
-                # import traceback
-                # traceback.print_exc()
-                time.sleep(2)
+                stats.record('errors')
                 if attempt == 4:
                      return None, f"Exception: {str(e)}"
-        
+                time.sleep(self.rate_limiter.backoff(attempt))
+                continue
+
+            if retry_after is None:
+                return df, error
+            stats.record('throttled')
+            time.sleep(retry_after)
+            if relogin:
+                print("Sustained throttling across symbols, refreshing session...")
+                self.login()
+
+        return None, "Max Retries Exceeded"
+
+    async def _fetch_range_async(self, symbol, params, stats):
+        """Async variant of _fetch_range."""
+        for attempt in range(5):
+            try:
+                await self.rate_limiter.acquire_async()
+                stats.record('requests')
+                response = await asyncio.to_thread(self.smartApi.getCandleData, params)
+                df, error, retry_after, relogin = self._interpret_candle_response(symbol, response, attempt)
+            except Exception as e:
+                print(f"Exception for {symbol}: {e}")
+                stats.record('errors')
+                if attempt == 4:
+                     return None, f"Exception: {str(e)}"
+                await asyncio.sleep(self.rate_limiter.backoff(attempt))
+                continue
+
+            if retry_after is None:
+                return df, error
+            stats.record('throttled')
+            await asyncio.sleep(retry_after)
+            if relogin:
+                print("Sustained throttling across symbols, refreshing session...")
+                await asyncio.to_thread(self.login)
+
         return None, "Max Retries Exceeded"
 
+    def _cached_result(self, token, interval, from_date, to_date, stats):
+        df = self.candle_cache.get(token, interval, from_date, to_date)
+        if df is None or df.empty:
+            return None, "No candles in range"
+        stats.record('symbols_ok')
+        return df, None
+
+    def fetch_historical_data(self, symbol, from_date, to_date, interval='ONE_DAY', stats=None):
+        """
+        Fetches historical data.
+        Bars already held in the local candle cache are served from disk; only the
+        uncovered parts of the window are requested from the API, split into pieces
+        no longer than MAX_DAYS_PER_REQUEST allows.
+        Returns (df, error_message)
+        """
+        params = self._candle_params(symbol, from_date, to_date, interval)
+        if params is None:
+            return None, f"Token Not Found for {symbol}"
+
+        stats = stats or FetchStats()
+        stats.record('symbols')
+        token = params['symboltoken']
+        missing = request_ranges(self.candle_cache.missing_ranges(token, interval, from_date, to_date), interval)
+        if not missing:
+            stats.record('cached')
+        for range_from, range_to in missing:
+            df, error = self._fetch_range(symbol, dict(params, fromdate=range_from, todate=range_to), stats)
+            if df is None:
+                return None, error
+            self.candle_cache.store(token, interval, df, range_from, range_to)
+            self.warehouse.append(symbol, interval, df)
+
+        return self._cached_result(token, interval, from_date, to_date, stats)
+
+    async def fetch_historical_data_async(self, symbol, from_date, to_date, interval='ONE_DAY', stats=None):
+        """
+        Async variant of fetch_historical_data for the FastAPI event loop.
+        The blocking SmartAPI calls and cache I/O run on the default executor and
+        retry waits use asyncio.sleep, so other requests keep being served while this waits.
+
+        Identical requests (symbol, interval, window) already in flight are coalesced:
+        later callers await the first one and share its DataFrame.
+        Returns (df, error_message)
+        """
+        key = (symbol, interval, from_date, to_date)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_historical_data_async(symbol, from_date, to_date, interval, stats))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        elif stats is not None:
+            stats.record('coalesced')
+        # shield: one caller going away must not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    async def _fetch_historical_data_async(self, symbol, from_date, to_date, interval, stats):
+        params = self._candle_params(symbol, from_date, to_date, interval)
+        if params is None:
+            return None, f"Token Not Found for {symbol}"
+
+        stats = stats or FetchStats()
+        stats.record('symbols')
+        token = params['symboltoken']
+        missing = await asyncio.to_thread(self.candle_cache.missing_ranges, token, interval, from_date, to_date)
+        missing = request_ranges(missing, interval)
+        if not missing:
+            stats.record('cached')
+        for range_from, range_to in missing:
+            df, error = await self._fetch_range_async(symbol, dict(params, fromdate=range_from, todate=range_to), stats)
+            if df is None:
+                return None, error
+            await asyncio.to_thread(self.candle_cache.store, token, interval, df, range_from, range_to)
+            await asyncio.to_thread(self.warehouse.append, symbol, interval, df)
+
+        return await asyncio.to_thread(self._cached_result, token, interval, from_date, to_date, stats)
+
+    async def fetch_many_async(self, jobs, concurrency=FETCH_CONCURRENCY, stats=None):
+        """
+        Fetches candles for many symbols with at most `concurrency` in flight.
+        jobs: iterable of (key, symbol, from_date, to_date, interval).
+        Async generator yielding (key, df, error_message) in order of completion.
+        Pass a FetchStats to collect request/throughput counters for the run.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(key, symbol, from_date, to_date, interval):
+            async with semaphore:
+                df, error = await self.fetch_historical_data_async(symbol, from_date, to_date, interval, stats)
+            return key, df, error
+
+        tasks = [asyncio.create_task(run(*job)) for job in jobs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Consumer stopped early (client disconnected): drop the remaining fetches
+            for task in tasks:
+                task.cancel()
+
 if __name__ == "__main__":
     # Test
     client = SmartApiClient()
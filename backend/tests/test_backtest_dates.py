@@ -0,0 +1,28 @@
+import pytest
+
+from backtest_runner import backtest_dates
+
+
+def test_single_date():
+    assert backtest_dates({'date': '2025-12-22'}) == ['2025-12-22']
+
+
+def test_range_skips_weekends_and_holidays():
+    # 25 Dec 2025 is an NSE holiday
+    assert backtest_dates({'start_date': '2025-12-22', 'end_date': '2025-12-28'}) == \
+        ['2025-12-22', '2025-12-23', '2025-12-24', '2025-12-26']
+    assert backtest_dates({'start_date': '2025-12-20', 'end_date': '2025-12-29', 'weekdays': [0]}) == \
+        ['2025-12-22', '2025-12-29']
+
+
+@pytest.mark.parametrize('payload', [
+    {'date': '2025-13-01'},
+    {'start_date': '2025-12-22', 'end_date': '2025-12-01'},
+    {'start_date': '2025-12-20', 'end_date': '2025-12-21', 'weekdays': [0]},
+    {'start_date': '2025-12-22', 'end_date': '2025-12-28', 'weekdays': 5},
+    {'start_date': '2025-12-22', 'end_date': '2025-12-28', 'weekdays': [7]},
+    {'start_date': '2025-12-22', 'end_date': '2025-12-28', 'weekdays': ['1']},
+])
+def test_rejected_payloads(payload):
+    with pytest.raises(ValueError):
+        backtest_dates(payload)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_engine import batch_result, calculate_indicators, validate_batch, validate_setup
+from candle_cache import to_naive_ist
+
+COMPARED = ('ema_9', 'ema_20', 'spread_pct', 'price_extension_pct')
+
+
+@pytest.fixture(scope='module')
+def universe():
+    """Random 15-minute frames of varying length, with indicators, and three signals per symbol."""
+    rng = np.random.default_rng(0)
+    days = pd.bdate_range('2025-11-03', periods=40)
+    slots = [day + pd.Timedelta(hours=9, minutes=15 + 15 * i) for day in days for i in range(25)]
+    frames, rows = {}, []
+    for k in range(150):
+        symbol = f"S{k}"
+        dates = pd.DatetimeIndex(slots[:rng.integers(5, 300)]).tz_localize('+05:30')
+        close = 100 * np.cumprod(1 + rng.normal(0.0008, 0.004, len(dates)))
+        df = pd.DataFrame({'date': dates, 'open': close, 'high': close, 'low': close,
+                           'close': close, 'volume': 1})
+        frames[symbol] = calculate_indicators(df)
+        for _ in range(3):
+            day = pd.Timestamp('2025-11-01') + pd.Timedelta(days=int(rng.integers(0, 70)))
+            last = close[int(rng.integers(0, len(close)))]
+            rows.append({
+                'tradingsymbol': symbol,
+                'date': day.strftime('%Y-%m-%dT18:30:00.000Z'),
+                'close': last * (1 + rng.normal(0, 0.01)),
+                'ltp': 1.0,
+                'is_stage2': bool(rng.random() < 0.8),
+                'stop_loss': 1,
+                'next_target': 2,
+                'appearance': [True, bool(rng.random() < 0.5)],
+                'note': '',
+            })
+    return frames, pd.DataFrame(rows)
+
+
+def test_validate_batch_matches_validate_setup(universe):
+    frames, signals = universe
+    candles = pd.concat([df.assign(symbol=symbol) for symbol, df in frames.items()], ignore_index=True)
+    batch = validate_batch(signals, candles)
+    assert batch['valid'].any() and not batch['valid'].all()
+
+    for i, row in signals.iterrows():
+        df = frames[row['tradingsymbol']]
+        # validate_setup is given only the bars up to the signal, as the per-day runner did
+        signal_time = pd.Timestamp(row['date']).tz_localize(None)
+        expected = validate_setup(row, df[to_naive_ist(df['date']) <= signal_time])
+        result = batch_result(batch.loc[i])
+        assert result['reason'] == expected['reason'], row.to_dict()
+        if expected['valid']:
+            assert result['note'] == expected['note']
+            for key in COMPARED:
+                assert result[key] == pytest.approx(expected[key])
+
+
+def test_validate_batch_accepts_column_arrays(universe):
+    frames, signals = universe
+    candles = pd.concat([df.assign(symbol=symbol) for symbol, df in frames.items()], ignore_index=True)
+    arrays = {name: candles[name].to_numpy() for name in ('symbol', 'date', 'close', 'EMA_9', 'EMA_20')}
+    pd.testing.assert_frame_equal(validate_batch(signals, arrays), validate_batch(signals, candles))
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from candle_cache import CandleCache
+
+INTERVAL = 'FIFTEEN_MINUTE'
+
+
+def bars(first_day, last_day):
+    days = pd.bdate_range(first_day, last_day)
+    dates = [day + pd.Timedelta(hours=9, minutes=15 + 15 * i) for day in days for i in range(25)]
+    close = [100.0] * len(dates)
+    return pd.DataFrame({'date': pd.DatetimeIndex(dates).tz_localize('+05:30'), 'open': close,
+                         'high': close, 'low': close, 'close': close, 'volume': 1})
+
+
+def test_missing_ranges_of_an_empty_cache(tmp_path):
+    cache = CandleCache(str(tmp_path))
+    assert cache.missing_ranges('1', INTERVAL, '2025-12-01 09:15', '2025-12-05 15:30') == \
+        [('2025-12-01 09:15', '2025-12-05 15:30')]
+
+
+def test_missing_ranges_returns_only_the_uncovered_gaps(tmp_path):
+    cache = CandleCache(str(tmp_path))
+    cache.store('1', INTERVAL, bars('2025-12-03', '2025-12-03'), '2025-12-03 09:15', '2025-12-03 15:30')
+    cache.store('1', INTERVAL, bars('2025-12-10', '2025-12-10'), '2025-12-10 09:15', '2025-12-10 15:30')
+    assert cache.missing_ranges('1', INTERVAL, '2025-12-01 09:15', '2025-12-12 15:30') == [
+        ('2025-12-01 09:15', '2025-12-03 09:14'),
+        ('2025-12-03 15:31', '2025-12-10 09:14'),
+        ('2025-12-10 15:31', '2025-12-12 15:30'),
+    ]
+    assert cache.missing_ranges('1', INTERVAL, '2025-12-03 09:15', '2025-12-03 15:30') == []
+    assert len(cache.get('1', INTERVAL, '2025-12-01 09:15', '2025-12-12 15:30')) == 50
+
+
+def test_missing_ranges_skips_gaps_without_trading_bars(tmp_path):
+    cache = CandleCache(str(tmp_path))
+    # Friday and Monday are covered; the weekend between them holds no bars
+    cache.store('1', INTERVAL, bars('2025-12-19', '2025-12-19'), '2025-12-19 09:15', '2025-12-19 15:30')
+    cache.store('1', INTERVAL, bars('2025-12-22', '2025-12-22'), '2025-12-22 09:15', '2025-12-22 15:30')
+    assert cache.missing_ranges('1', INTERVAL, '2025-12-19 09:15', '2025-12-22 15:30') == []
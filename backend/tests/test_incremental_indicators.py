@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from backtest_engine import IncrementalIndicators, calculate_indicators
+from indicators import ema
+
+
+def frame(first, last):
+    dates = pd.date_range('2026-01-01 09:15', periods=400, freq='15min')
+    close = np.round(100 + np.cumsum(np.random.default_rng(0).normal(size=400)), 2)
+    close[100:140] = close[100]
+    df = pd.DataFrame({'date': dates, 'open': close, 'high': close, 'low': close, 'close': close, 'volume': 1.0})
+    return df.iloc[first:last].reset_index(drop=True), dates
+
+
+def test_results_do_not_depend_on_earlier_frames():
+    indicators = IncrementalIndicators()
+    earlier, _ = frame(0, 200)
+    indicators.apply('X', 'I', earlier)
+    later, dates = frame(50, 400)
+    result = indicators.apply('X', 'I', later.copy(), needed_from=dates[350])
+    expected = calculate_indicators(later.copy())
+    for name in ('EMA_9', 'EMA_20'):
+        assert (result[name].to_numpy() == expected[name].to_numpy()).all()
+
+
+def test_continued_values_are_identical_to_a_fresh_compute():
+    indicators = IncrementalIndicators()
+    indicators.apply('X', 'I', frame(0, 200)[0])
+    full, dates = frame(0, 400)
+    result = indicators.apply('X', 'I', full.copy(), needed_from=dates[350])
+    expected = calculate_indicators(full.copy())
+    # Only the bars from the stored last bar on are computed
+    assert result['EMA_9'].first_valid_index() == 199
+    for name in ('EMA_9', 'EMA_20'):
+        assert (result[name].to_numpy()[199:] == expected[name].to_numpy()[199:]).all()
+
+
+def test_stacked_and_single_rows_agree():
+    full, _ = frame(0, 400)
+    close = full['close'].to_numpy()
+    stacked = np.vstack([close, close[::-1]])
+    assert (ema(stacked, 20)[0] == ema(close[None, :], 20)[0]).all()
@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+import jobs
+from jobs import COMPLETED, INTERRUPTED, JobManager
+
+PAYLOAD = {'date': '2025-12-22'}
+
+
+def write_job(root, job_id, status, events):
+    job_dir = root / job_id
+    job_dir.mkdir(parents=True)
+    (job_dir / "meta.json").write_text(json.dumps({'payload': PAYLOAD, 'status': status}))
+    (job_dir / "events.ndjson").write_text("".join(json.dumps(event) + "\n" for event in events))
+
+
+def test_resume_skips_completed_symbols(tmp_path, monkeypatch):
+    # Interrupted while BBB was being fetched (torn last line); CCC's fetch had failed
+    write_job(tmp_path, "abc123", 'running', [
+        {'type': 'symbol_done', 'symbol': 'AAA', 'results': [['2025-12-22', {'valid': True}]]},
+        {'type': 'symbol_done', 'symbol': 'CCC', 'results': [], 'failed': True},
+    ])
+    with open(tmp_path / "abc123" / "events.ndjson", 'a') as f:
+        f.write('{"type": "symbol_do')
+
+    seen = {}
+
+    async def run_events(payload, completed):
+        seen['completed'] = completed
+        yield {'type': 'complete', 'valid_count': 1, 'rejected_count': 0, 'failed_symbols': 0}
+
+    monkeypatch.setattr(jobs, 'run_events', run_events)
+
+    async def resume():
+        manager = JobManager(str(tmp_path))
+        assert manager.get("abc123").status == INTERRUPTED
+        job = manager.resume("abc123")
+        await job.task
+        return job
+
+    job = asyncio.run(resume())
+    assert seen['completed'] == {'AAA': [['2025-12-22', {'valid': True}]]}
+    assert job.status == COMPLETED
+    reloaded = JobManager(str(tmp_path)).get("abc123")
+    assert reloaded.status == COMPLETED
+    assert [json.loads(line)['type'] for line in reloaded.events] == ['symbol_done', 'symbol_done', 'complete']
+
+
+def test_unknown_job(tmp_path):
+    manager = JobManager(str(tmp_path))
+    assert manager.get("nosuchjob") is None
+    assert manager.get("../etc") is None
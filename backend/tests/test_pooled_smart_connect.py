@@ -0,0 +1,37 @@
+from unittest import mock
+
+import pytest
+import SmartApi.smartConnect as smart_connect
+
+import smart_api_client
+from smart_api_client import PooledSmartConnect
+
+THROTTLED = b'{"status": false, "message": "Access denied because of exceeding access rate", ' \
+            b'"errorcode": "AB1004", "data": null}'
+
+
+class Response:
+    status_code = 200
+    content = THROTTLED
+
+
+@pytest.fixture
+def api():
+    return PooledSmartConnect(api_key="key")
+
+
+def test_failed_reply_is_logged(api):
+    with mock.patch.object(smart_api_client.http_session, 'request', return_value=Response()) as request, \
+            mock.patch.object(smart_connect.logger, 'error') as error:
+        data = api._request('api.candle.data', 'POST', {'symboltoken': '2885'})
+    assert data['errorcode'] == 'AB1004'
+    assert request.call_count == 1
+    assert 'AB1004' in error.call_args[0][0]
+
+
+def test_request_exception_is_logged(api):
+    with mock.patch.object(smart_api_client.http_session, 'request', side_effect=OSError("reset")), \
+            mock.patch.object(smart_connect.logger, 'error') as error:
+        with pytest.raises(OSError):
+            api._request('api.candle.data', 'POST', {})
+    assert 'reset' in error.call_args[0][0]
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import scrip_master
+from scrip_master import ScripIndex, build_scrip_index, download_scrip_master
+
+ITEMS = [
+    {'token': '2885', 'symbol': 'RELIANCE-EQ', 'exch_seg': 'NSE', 'tick_size': '5.000000'},
+    {'token': '11536', 'symbol': 'TCS-EQ', 'exch_seg': 'NSE', 'tick_size': '5.000000'},
+    {'token': '99926000', 'symbol': 'Nifty 50', 'exch_seg': 'NSE', 'tick_size': ''},
+    {'token': '500325', 'symbol': 'RELIANCE', 'exch_seg': 'BSE', 'tick_size': '5.000000'},
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    json_path = tmp_path / "scrip_master.json"
+    json_path.write_text(json.dumps(ITEMS))
+    index_path = str(tmp_path / "scrip_master.idx")
+    assert build_scrip_index(str(json_path), index_path) == 3
+    index = ScripIndex(index_path)
+    yield index
+    index.close()
+
+
+def test_round_trip(index):
+    assert sorted(index) == ['Nifty 50', 'RELIANCE', 'TCS']
+    reliance = index['RELIANCE']
+    assert (reliance.token, reliance.symbol, reliance.exch_seg, reliance.tick_size) == \
+        (2885, 'RELIANCE-EQ', 'NSE', 5.0)
+    assert index['Nifty 50'].tick_size == 0.0
+
+
+def test_missing_symbol(index):
+    assert 'INFY' not in index
+    with pytest.raises(KeyError):
+        index['INFY']
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_unresumable_partial_download_is_discarded(tmp_path, monkeypatch):
+    json_path = str(tmp_path / "scrip_master.json")
+    part_path = json_path + ".part"
+    with open(part_path, 'wb') as f:
+        f.write(b'[{"token"')
+    scrip_master._write_meta(json_path, {'partial': {'etag': '"v1"'}})
+    sent = {}
+
+    def get(url, headers=None, **kwargs):
+        sent.update(headers)
+        return Response(416)
+
+    monkeypatch.setattr(scrip_master.session, 'get', get)
+    assert download_scrip_master("https://example.invalid/scrip.json", json_path) is None
+    assert sent['Range'] == "bytes=9-"
+    assert not (tmp_path / "scrip_master.json.part").exists()
+    assert scrip_master._read_meta(json_path)['partial'] is None
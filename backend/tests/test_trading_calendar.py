@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from trading_calendar import CALENDAR
+
+
+def test_bars_between_within_a_session():
+    start = datetime(2025, 12, 22, 9, 15)
+    assert CALENDAR.bars_between(start, datetime(2025, 12, 22, 10, 15), 'FIFTEEN_MINUTE') == 4
+    assert CALENDAR.bars_between(start, datetime(2025, 12, 22, 10, 16), 'FIFTEEN_MINUTE') == 5
+    assert CALENDAR.bars_between(start, start, 'FIFTEEN_MINUTE') == 0
+
+
+def test_bars_between_skips_weekends_and_holidays():
+    # Friday 19 Dec to Monday 22 Dec 2025: one whole session in between
+    assert CALENDAR.bars_between(datetime(2025, 12, 19), datetime(2025, 12, 22), 'FIFTEEN_MINUTE') == 25
+    assert CALENDAR.bars_between(datetime(2025, 12, 20), datetime(2025, 12, 22), 'FIFTEEN_MINUTE') == 0
+    # 25 Dec 2025 is an NSE holiday
+    assert CALENDAR.bars_between(datetime(2025, 12, 25), datetime(2025, 12, 26), 'FIFTEEN_MINUTE') == 0
+
+
+def test_bars_between_after_the_close():
+    assert CALENDAR.bars_between(datetime(2025, 12, 22, 15, 30), datetime(2025, 12, 23, 9, 15),
+                                 'FIFTEEN_MINUTE') == 0
+    assert CALENDAR.bars_between(datetime(2025, 12, 22), datetime(2025, 12, 23), 'ONE_DAY') == 1
+
+
+def test_every_fetchable_interval_has_a_bar_grid():
+    from smart_api_client import MAX_DAYS_PER_REQUEST
+
+    for interval in MAX_DAYS_PER_REQUEST:
+        assert CALENDAR.bars_between(datetime(2025, 12, 22), datetime(2025, 12, 23), interval) >= 1
+    assert CALENDAR.bars_per_session('THREE_MINUTE') == 125
@@ -0,0 +1,120 @@
+from datetime import date, datetime, time
+
+import numpy as np
+
+# NSE equity trading holidays (weekday closures). Update yearly from the NSE holiday circular.
+NSE_HOLIDAYS = {
+    # 2024
+    date(2024, 1, 22), date(2024, 1, 26), date(2024, 3, 8), date(2024, 3, 25), date(2024, 3, 29),
+    date(2024, 4, 11), date(2024, 4, 17), date(2024, 5, 1), date(2024, 5, 20), date(2024, 6, 17),
+    date(2024, 7, 17), date(2024, 8, 15), date(2024, 10, 2), date(2024, 11, 1), date(2024, 11, 15),
+    date(2024, 11, 20), date(2024, 12, 25),
+    # 2025
+    date(2025, 2, 26), date(2025, 3, 14), date(2025, 3, 31), date(2025, 4, 10), date(2025, 4, 14),
+    date(2025, 4, 18), date(2025, 5, 1), date(2025, 8, 15), date(2025, 8, 27), date(2025, 10, 2),
+    date(2025, 10, 21), date(2025, 10, 22), date(2025, 11, 5), date(2025, 12, 25),
+    # 2026
+    date(2026, 1, 15), date(2026, 1, 26), date(2026, 3, 3), date(2026, 3, 26), date(2026, 3, 31),
+    date(2026, 4, 3), date(2026, 4, 14), date(2026, 5, 1), date(2026, 5, 28), date(2026, 6, 26),
+    date(2026, 9, 14), date(2026, 10, 2), date(2026, 10, 20), date(2026, 11, 10), date(2026, 11, 24),
+    date(2026, 12, 25),
+}
+
+# Span of the precomputed session table. Outside the years listed above only weekends are closed.
+CALENDAR_START = date(2020, 1, 1)
+CALENDAR_END = date(2030, 12, 31)
+
+SESSION_OPEN = time(9, 15)
+SESSION_CLOSE = time(15, 30)
+_OPEN_MINUTE = SESSION_OPEN.hour * 60 + SESSION_OPEN.minute
+_CLOSE_MINUTE = SESSION_CLOSE.hour * 60 + SESSION_CLOSE.minute
+
+# Bar length in minutes for each SmartAPI interval (ONE_DAY bars are stamped at midnight)
+INTERVAL_MINUTES = {'ONE_MINUTE': 1, 'THREE_MINUTE': 3, 'FIVE_MINUTE': 5, 'TEN_MINUTE': 10, 'FIFTEEN_MINUTE': 15,
+                    'THIRTY_MINUTE': 30, 'ONE_HOUR': 60}
+
+
+def slot_grid(interval):
+    """Bar start times within a session, as minutes after midnight."""
+    if interval == 'ONE_DAY':
+        return np.array([0])
+    return np.arange(_OPEN_MINUTE, _CLOSE_MINUTE, INTERVAL_MINUTES[interval])
+
+
+# 15-minute grid: 09:15, 09:30, ... 15:15 (25 bars)
+SLOTS = slot_grid('FIFTEEN_MINUTE')
+
+
+class TradingCalendar:
+    """
+    Precomputed NSE sessions between CALENDAR_START and CALENDAR_END.
+
+    `sessions` is the sorted array of trading days and `index` maps each of them to its
+    position, so "n sessions back", "sessions between two days" and "bars between two
+    times" are array lookups instead of day-by-day stepping and datetime filtering.
+    """
+
+    def __init__(self, start=CALENDAR_START, end=CALENDAR_END, holidays=NSE_HOLIDAYS):
+        days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+        weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+        closed = np.isin(days, np.array(sorted(holidays), dtype='datetime64[D]'))
+        self.sessions = days[(weekday < 5) & ~closed]
+        self.index = {day: i for i, day in enumerate(self.sessions.tolist())}
+        self._grids = {}
+
+    def is_session(self, day):
+        return day in self.index
+
+    def position(self, day):
+        """Position of the latest session on or before day (-1 if none)."""
+        i = self.index.get(day)
+        if i is None:
+            i = int(np.searchsorted(self.sessions, np.datetime64(day, 'D'), side='right')) - 1
+        return i
+
+    def positions(self, days):
+        """Vectorized position() over an array of datetime64 values."""
+        return np.searchsorted(self.sessions, np.asarray(days, dtype='datetime64[D]'), side='right') - 1
+
+    def previous_session(self, day):
+        """The latest trading day on or before day."""
+        return self.sessions[self.position(day)].item()
+
+    def sessions_back(self, day, n):
+        """The trading day n sessions before the latest session on or before day."""
+        return self.sessions[max(self.position(day) - n, 0)].item()
+
+    def sessions_between(self, earlier, later):
+        """Sessions that open after `earlier`'s session, up to and including `later`."""
+        return self.position(later) - self.position(earlier)
+
+    def bars_per_session(self, interval):
+        return len(self.grid(interval))
+
+    def grid(self, interval):
+        grid = self._grids.get(interval)
+        if grid is None:
+            grid = self._grids[interval] = slot_grid(interval)
+        return grid
+
+    def bar_count(self, moment, interval, inclusive=True):
+        """Bars of `interval` starting at or before moment (before it, if not inclusive)."""
+        day = moment.date()
+        grid = self.grid(interval)
+        i = self.position(day)
+        if i >= 0 and self.sessions[i].item() == day:
+            minute = moment.hour * 60 + moment.minute
+            today = int(np.searchsorted(grid, minute, side='right' if inclusive else 'left'))
+            return i * len(grid) + today
+        return (i + 1) * len(grid)
+
+    def bars_between(self, start, end, interval):
+        """Bars of `interval` starting in [start, end)."""
+        return self.bar_count(end, interval, inclusive=False) - self.bar_count(start, interval, inclusive=False)
+
+
+def session_open(day):
+    return datetime.combine(day, SESSION_OPEN)
+
+
+CALENDAR = TradingCalendar()
@@ -21,6 +21,7 @@ type Trade = {
   is_fno?: boolean;
   is_stage2?: boolean;
   note?: string;
+  date?: string;
 };
 
 type RejectedTrade = {
@@ -29,7 +30,9 @@ type RejectedTrade = {
 };
 
 type LogMessage = {
-  type: 'status' | 'progress' | 'match_found' | 'error' | 'complete' | 'match_rejected';
+  type: 'status' | 'progress' | 'match_found' | 'error' | 'complete' | 'match_rejected' | 'day_complete' | 'job' | 'symbol_done';
+  job_id?: string;
+  reused?: boolean;
   message?: string;
   value?: number;
   current_symbol?: string;
@@ -37,6 +40,7 @@ type LogMessage = {
   valid_count?: number;
   rejected_count?: number;
   valid_trades?: Trade[];
+  date?: string;
 };
 
 // --- Utils ---
@@ -68,6 +72,8 @@ const Badge = ({ children, type }: { children: React.ReactNode; type: 'green' |
 
 export default function Dashboard() {
   const [date, setDate] = useState('2026-01-01');
+  // Optional: when set, the backend runs every trading day from `date` to `endDate` in one job
+  const [endDate, setEndDate] = useState('');
   const [isRunning, setIsRunning] = useState(false);
   const [progress, setProgress] = useState(0);
   const [status, setStatus] = useState('Ready');
@@ -95,18 +101,16 @@ export default function Dashboard() {
     // Use env var or default to localhost
     const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
-    try {
-      const response = await fetch(`${API_URL}/run-backtest`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ date }),
-      });
-
+    let jobId = '';
+    let received = 0; // job event lines seen, the offset to re-attach from
+    // Reads an NDJSON stream; returns true once the run has finished (complete/error)
+    const readStream = async (response: Response) => {
       if (!response.body) throw new Error("No response body");
 
       const reader = response.body.getReader();
       const decoder = new TextDecoder();
       let buffer = '';
+      let finished = false;
 
       while (true) {
         const { value, done } = await reader.read();
@@ -120,12 +124,44 @@ export default function Dashboard() {
           if (!line.trim()) continue;
           try {
             const msg: LogMessage = JSON.parse(line);
+            if (msg.type === 'job') {
+              jobId = msg.job_id || '';
+              if (msg.reused) setLogs(prev => [...prev, `[STATUS] Identical run found, showing job ${jobId}`]);
+              continue;
+            }
+            received += 1;
+            if (msg.type === 'complete' || msg.type === 'error') finished = true;
             handleMessage(msg);
           } catch (e) {
             console.error("Parse Error", e, line);
           }
         }
       }
+      return finished;
+    };
+
+    try {
+      const response = await fetch(`${API_URL}/run-backtest`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(endDate ? { start_date: date, end_date: endDate } : { date }),
+      });
+
+      let finished = false;
+      try {
+        finished = await readStream(response);
+      } catch (error) {
+        if (!jobId) throw error;
+      }
+      // The backtest keeps running server-side as a job: re-attach where we left off
+      for (let attempt = 0; !finished && jobId && attempt < 3; attempt++) {
+        setLogs(prev => [...prev, `[STATUS] Connection lost, re-attaching to job ${jobId}...`]);
+        try {
+          finished = await readStream(await fetch(`${API_URL}/jobs/${jobId}/events?offset=${received}`));
+        } catch (error) {
+          console.error(error);
+        }
+      }
     } catch (error) {
       console.error(error);
       setStatus('Connection Failed');
@@ -147,7 +183,7 @@ export default function Dashboard() {
     } else if (msg.type === 'match_found') {
       setValidTrades(prev => {
         // Avoid duplicates
-        if (prev.find(t => t.symbol === msg.data!.symbol)) return prev;
+        if (prev.find(t => t.symbol === msg.data!.symbol && t.date === msg.data!.date)) return prev;
         return [...prev, msg.data!];
       });
       setLogs(prev => [...prev, `[MATCH] Found ${msg.data!.symbol} (Spread: ${msg.data!.spread_pct?.toFixed(2)}%, Ext: ${msg.data!.price_extension_pct?.toFixed(2)}%)`]);
@@ -156,6 +192,8 @@ export default function Dashboard() {
       setLogs(prev => [...prev, `[REJECT] ${msg.current_symbol || 'Unknown'}: ${msg.message}`]);
     } else if (msg.type === 'error') {
       setLogs(prev => [...prev, `[ERROR] ${msg.message}`]);
+    } else if (msg.type === 'day_complete') {
+      setLogs(prev => [...prev, `[DAY] ${msg.date}: ${msg.valid_count} valid, ${msg.rejected_count} rejected`]);
     } else if (msg.type === 'complete') {
       if (msg.valid_trades && msg.valid_trades.length > 0) {
         // Backend now sorts the list by Quality. Replace our streaming list with the final sorted one.
@@ -223,6 +261,17 @@ export default function Dashboard() {
               />
             </div>
 
+            <div>
+              <label className="block text-xs font-semibold text-slate-400 uppercase tracking-wider mb-2">End Date (optional, range)</label>
+              <input
+                type="date"
+                value={endDate}
+                min={date}
+                onChange={(e) => setEndDate(e.target.value)}
+                className="w-full bg-[#0F172A] border border-slate-700 rounded-lg px-4 py-2.5 text-sm text-slate-200 focus:ring-1 focus:ring-indigo-500 outline-none transition-all"
+              />
+            </div>
+
             <motion.button
               whileHover={{ scale: 1.01 }}
               whileTap={{ scale: 0.99 }}
@@ -310,13 +359,13 @@ export default function Dashboard() {
 
                       return (
                         <motion.tr
-                          key={trade.symbol}
+                          key={`${trade.symbol}-${trade.date}`}
                           initial={{ opacity: 0 }}
                           animate={{ opacity: 1 }}
                           className="hover:bg-slate-800/30 transition-colors group"
                         >
                           <td className="p-4 text-sm text-slate-400 font-mono">
-                            {formatDate(date)}
+                            {formatDate(trade.date || date)}
                           </td>
                           <td className="p-4">
                             <div className="flex flex-col gap-1.5">